@@ -1,26 +1,39 @@
 ## Importing libraries and files
 import os
+import copy
+from types import MappingProxyType
 from dotenv import load_dotenv
 load_dotenv()
 
-from langchain_openai import ChatOpenAI
 from crewai import Agent
+from llm import get_llm
 
-from tools import search_tool, read_data_tool
+from tools import search_tool, read_data_tool, search_document_tool, financial_metrics_tool, statement_lookup_tool
 
 ### Loading LLM
 # FIX (Bug #1): `llm = llm` caused NameError — llm was never defined.
-# Added proper LLM initialization with ChatOpenAI.
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.2
-)
+# Added proper LLM initialization (gpt-4o-mini, temperature 0.2), now wrapped in
+# the local response cache — see `llm.py`. One client is shared per process.
+
+## Agent templates
+# The definitions below are immutable templates, not live agents. `build_agent` creates
+# a fresh Agent (own executor, memory and tool state) for every job, so concurrent jobs
+# never share mutable agent state.
+def freeze_template(**fields) -> MappingProxyType:
+    fields["tools"] = tuple(fields.get("tools", ()))
+    return MappingProxyType(fields)
+
+
+def build_agent(template: MappingProxyType) -> Agent:
+    fields = dict(template)
+    fields["tools"] = [copy.copy(t) for t in template["tools"]]
+    return Agent(**fields, llm=get_llm())
 
 # PROMPT IMPROVEMENT: Rewrote all agent goals and backstories from intentionally
 # broken/unprofessional prompts to structured, accurate, regulatory-compliant definitions.
 
 # Creating an Experienced Financial Analyst agent
-financial_analyst = Agent(
+financial_analyst = freeze_template(
     role="Senior Financial Analyst",
     goal=(
         "Thoroughly analyze the financial document at the path provided in {file_path} "
@@ -40,15 +53,15 @@ financial_analyst = Agent(
         "and always flag uncertainty where it exists. Your analysis is always compliant with CFA Institute "
         "standards and SEC disclosure requirements."
     ),
-    tools=[read_data_tool],  # FIX (Bug #2): `tool=` is invalid — must be `tools=` (plural)
-    llm=llm,
+    tools=[financial_metrics_tool, statement_lookup_tool, search_document_tool, read_data_tool],  # FIX (Bug #2): `tool=` is invalid — must be `tools=` (plural)
     max_iter=5,   # FIX (Bug #3): max_iter=1 caused incomplete output after just 1 attempt
-    max_rpm=10,  # FIX (Bug #3): max_rpm=1 throttled to 1 call/minute — extremely slow
+    # FIX (Bug #3): max_rpm=1 throttled to 1 call/minute. Rate limiting is now global
+    # across all jobs and agents (LLM_RPM / LLM_TPM, see `rate_limiter.py`), not per agent.
     allow_delegation=True
 )
 
 # Creating a document verifier agent
-verifier = Agent(
+verifier = freeze_template(
     role="Financial Document Compliance Verifier",
     goal=(
         "Verify that the uploaded document at {file_path} is a legitimate financial report "
@@ -67,14 +80,12 @@ verifier = Agent(
         "or red flags in financial reporting. You take document verification seriously as the foundation "
         "of any reliable financial analysis."
     ),
-    llm=llm,
     max_iter=5,   # FIX (Bug #3): Raised from 1
-    max_rpm=10,  # FIX (Bug #3): Raised from 1
     allow_delegation=False
 )
 
 
-investment_advisor = Agent(
+investment_advisor = freeze_template(
     role="Certified Investment Advisor",
     goal=(
         "Based strictly on the financial data analyzed from {file_path} and the user's query: {query}, "
@@ -93,14 +104,12 @@ investment_advisor = Agent(
         "opinions and always disclose the assumptions behind your recommendations. "
         "You never endorse speculative assets without rigorous justification."
     ),
-    llm=llm,
     max_iter=5,   # FIX (Bug #3): Raised from 1
-    max_rpm=10,  # FIX (Bug #3): Raised from 1
     allow_delegation=False
 )
 
 
-risk_assessor = Agent(
+risk_assessor = freeze_template(
     role="Financial Risk Assessment Specialist",
     goal=(
         "Conduct a rigorous risk assessment of the company based on financial data from {file_path} "
@@ -119,8 +128,6 @@ risk_assessor = Agent(
         "to support your conclusions. You provide actionable risk mitigation strategies tailored "
         "to the company's specific financial profile."
     ),
-    llm=llm,
     max_iter=5,   # FIX (Bug #3): Raised from 1
-    max_rpm=10,  # FIX (Bug #3): Raised from 1
     allow_delegation=False
 )
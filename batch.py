@@ -0,0 +1,175 @@
+## Batch analysis: many filings, one query
+# A batch saves every PDF (or every PDF inside an uploaded zip) to content-addressed
+# storage, pre-extracts and indexes all of them in parallel in a process pool, and
+# fans one analysis job per document out to the worker pool on the `batch` queue,
+# whose concurrency is capped by the worker `--queues batch=N` limit. Jobs stay
+# `preparing` (not claimable) until their document's preparation has finished.
+import os
+import asyncio
+import zipfile
+import threading
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, UploadFile
+
+import database as db_mod
+import result_store
+from cache import extraction_cache, file_sha256
+from uploads import save_upload, save_stream, MAX_UPLOAD_BYTES
+
+BATCH_QUEUE = "batch"
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "100"))
+PREP_WORKERS = int(os.getenv("BATCH_PREP_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+_prep_pool = None
+_prep_lock = threading.Lock()
+_preparing = {}  # content hash -> preparation future, while in flight in this process
+
+
+def prepare_document(path: str) -> str:
+    """Extracts text and builds the chunk index and statement tables for one PDF (runs in a child process)."""
+    # pypdf/NumPy/Arrow are imported here, in the preparation process, so the API starts fast
+    from extraction import iter_pages, join_pages
+    from retrieval import DocumentIndex, index_path_for
+    from statements import extract_statements, load_statements, save_statements, table_path_for
+
+    digest = file_sha256(path)
+    index_path = index_path_for(path)
+    table_path = table_path_for(path)
+    if (extraction_cache.get(digest) is not None and DocumentIndex.load(index_path, digest) is not None
+            and load_statements(table_path, digest) is not None):
+        return digest
+    # One sequential pass over the pages feeds the text cache, the index and the tables;
+    # parallelism comes from preparing many documents at once
+    pages = list(iter_pages(path, parallel=False))
+    extraction_cache.put(digest, join_pages(pages)[0])
+    DocumentIndex.from_pages(pages, digest).save(index_path)
+    save_statements(extract_statements(pages, digest), table_path)
+    return digest
+
+
+def get_prep_pool() -> ProcessPoolExecutor:
+    """This process's document preparation pool, started on first use."""
+    global _prep_pool
+    with _prep_lock:
+        if _prep_pool is None:
+            # Same start method and shutdown hook as the extraction pool (see `extraction._get_pool`)
+            _prep_pool = ProcessPoolExecutor(max_workers=PREP_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            multiprocessing.util.Finalize(_prep_pool, _prep_pool.shutdown,
+                                          kwargs={"wait": True, "cancel_futures": True}, exitpriority=100)
+        return _prep_pool
+
+
+def _release_jobs(content_hash: str, future):
+    # Released even if preparation failed: the worker then extracts (and reports) it itself
+    with _prep_lock:
+        if _preparing.get(content_hash) is future:
+            del _preparing[content_hash]
+    with db_mod.session_scope() as db:
+        db_mod.release_prepared_tasks(db, content_hash)
+
+
+def submit_preparation(documents: list):
+    """Queues extraction/indexing for (path, content_hash) pairs without blocking; the
+    documents' `preparing` jobs are released once it finishes."""
+    pool = get_prep_pool()
+    with _prep_lock:
+        for path, content_hash in documents:
+            future = _preparing.get(content_hash)
+            if future is None:
+                future = _preparing[content_hash] = pool.submit(prepare_document, path)
+            # Also runs (immediately) if that document's preparation has finished meanwhile
+            future.add_done_callback(lambda f, h=content_hash: _release_jobs(h, f))
+
+
+def _save_zip_members(stream, limit: int) -> list:
+    """Saves the PDFs in a zip archive; rejects it before writing anything if it holds
+    more than `limit` of them."""
+    documents = []
+    with zipfile.ZipFile(stream) as archive:
+        members = []
+        for member in archive.infolist():
+            name = os.path.basename(member.filename)
+            if member.is_dir() or not name.lower().endswith(".pdf") or name.startswith("."):
+                continue
+            if member.file_size > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"{name} exceeds the upload size limit")
+            members.append((name, member))
+            if len(members) > limit:
+                raise HTTPException(status_code=413, detail=f"A batch may contain at most {BATCH_MAX_FILES} documents")
+        for name, member in members:
+            with archive.open(member) as member_stream:
+                path, content_hash, _ = save_stream(member_stream)
+            documents.append((name, path, content_hash))
+    return documents
+
+
+async def save_batch_files(files: list) -> list:
+    """Saves uploaded PDFs and zip archives; returns [(filename, path, content_hash)]."""
+    documents = []
+    for file in files:
+        name = file.filename or ""
+        if name.lower().endswith(".zip"):
+            try:
+                documents.extend(await asyncio.to_thread(_save_zip_members, file.file,
+                                                         BATCH_MAX_FILES - len(documents)))
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{name} is not a valid zip archive")
+        elif name.lower().endswith(".pdf"):
+            path, content_hash, _ = await save_upload(file)
+            documents.append((name, path, content_hash))
+        else:
+            raise HTTPException(status_code=400, detail=f"{name}: only PDF and zip files are supported")
+        if len(documents) > BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"A batch may contain at most {BATCH_MAX_FILES} documents")
+    if not documents:
+        raise HTTPException(status_code=400, detail="No PDF documents found in the upload")
+    return documents
+
+
+def enqueue_batch(db, query: str, documents: list, priority: int = 0, force_refresh: bool = False) -> str:
+    """Creates the batch and one job per document, reusing memoized or in-flight results."""
+    batch_id = db_mod.create_batch(db, query)
+    items = []
+    to_prepare = []
+    for filename, path, content_hash in documents:
+        existing = None if force_refresh else db_mod.find_reusable_task(db, content_hash, query)
+        if existing:
+            items.append((existing.task_id, filename))
+            continue
+        task_id = db_mod.create_task(db, filename, query, file_path=path, queue=BATCH_QUEUE, priority=priority,
+                                     content_hash=content_hash, commit=False, status="preparing")
+        items.append((task_id, filename))
+        to_prepare.append((path, content_hash))
+    # One commit for every job and batch item, instead of one per document
+    db_mod.add_batch_items(db, batch_id, items)
+    submit_preparation(to_prepare)
+    return batch_id
+
+
+def batch_summary(db, batch_id: str):
+    """Aggregate status plus per-document results (partial while still running)."""
+    rows = db_mod.get_batch_tasks(db, batch_id)
+    if not rows:
+        return None
+    counts = {}
+    documents = []
+    for filename, task in rows:
+        counts[task.status] = counts.get(task.status, 0) + 1
+        documents.append({
+            "filename": filename,
+            "task_id": task.task_id,
+            "status": task.status,
+            "result": result_store.task_result(task) if task.status in db_mod.TERMINAL_STATUSES else None,
+        })
+    done = sum(n for status, n in counts.items() if status in db_mod.TERMINAL_STATUSES)
+    return {
+        "batch_id": batch_id,
+        "status": "completed" if done == len(rows) else "running",
+        "total": len(rows),
+        "done": done,
+        "counts": counts,
+        "documents": documents,
+    }
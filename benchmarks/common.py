@@ -0,0 +1,90 @@
+## Shared helpers: timing statistics, RSS sampling and isolated working directories
+import os
+import sys
+import time
+import resource
+import tempfile
+import statistics
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def enter_sandbox() -> str:
+    """chdir into a fresh temp dir so the SQLite DB, data/ and cache/ are throwaway.
+
+    Must run before importing repo modules, which open `./financial_analysis.db` at import.
+    """
+    sandbox = tempfile.mkdtemp(prefix="fda-bench-")
+    os.chdir(sandbox)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    os.environ.setdefault("EXTRACTION_CACHE_DIR", os.path.join(sandbox, "cache", "extractions"))
+    return sandbox
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples: list, ops: int = None) -> dict:
+    """Latency summary in milliseconds plus throughput (ops/sec) for `samples` in seconds."""
+    total = sum(samples)
+    ops = ops if ops is not None else len(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": 1000 * statistics.fmean(samples) if samples else 0.0,
+        "p50_ms": 1000 * percentile(samples, 50),
+        "p99_ms": 1000 * percentile(samples, 99),
+        "throughput_per_s": ops / total if total else 0.0,
+    }
+
+
+def timed(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def peak_rss_mb(pid: int = None) -> float:
+    """Peak RSS of `pid` (Linux /proc VmHWM) or of this process and its reaped children."""
+    if pid is not None:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024.0
+        except OSError:
+            return 0.0
+        return 0.0
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+    return max(own, children) / scale
+
+
+def process_tree_peak_rss_mb(root_pid: int) -> float:
+    """Sum of peak RSS over `root_pid` and its live descendants (API + embedded workers)."""
+    pids = [root_pid]
+    try:
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == root_pid:
+                pids.append(int(entry))
+    except OSError:
+        pass
+    return sum(peak_rss_mb(pid) for pid in pids)
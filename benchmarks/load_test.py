@@ -0,0 +1,108 @@
+## End-to-end load test of POST /analyze + GET /status with the fake LLM
+# Starts uvicorn in a throwaway directory with LLM_BACKEND=fake and embedded workers,
+# then submits `c` concurrent jobs per level and polls /status until all finish.
+import os
+import sys
+import time
+import socket
+import asyncio
+import subprocess
+
+import httpx
+
+from benchmarks.common import REPO_ROOT, summarize, percentile, process_tree_peak_rss_mb
+from benchmarks.synthetic_pdf import write_pdf
+
+CONCURRENCY_LEVELS = (1, 4, 16, 64)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, workers: int, llm_latency_ms: float):
+    port = _free_port()
+    env = dict(os.environ,
+               LLM_BACKEND="fake",
+               FAKE_LLM_LATENCY_MS=str(llm_latency_ms),
+               EMBEDDED_WORKERS=str(workers),
+               WORKER_QUEUES=f"default={workers},batch={workers}",
+               WORKER_POLL_INTERVAL="0.1",
+               PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", REPO_ROOT, "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(base_url + "/", timeout=1).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("API server did not start within 60s")
+
+
+async def _run_job(client: httpx.AsyncClient, pdf: bytes, name: str, status_samples: list, timeout: float):
+    start = time.perf_counter()
+    response = await client.post("/analyze", files={"file": (name, pdf, "application/pdf")},
+                                 data={"query": "Benchmark query", "force_refresh": "true"})
+    response.raise_for_status()
+    task_id = response.json()["task_id"]
+    while time.perf_counter() - start < timeout:
+        poll_start = time.perf_counter()
+        status = (await client.get(f"/status/{task_id}")).json()["status"]
+        status_samples.append(time.perf_counter() - poll_start)
+        if status not in ("pending", "running"):
+            return time.perf_counter() - start, status
+        await asyncio.sleep(0.2)
+    return time.perf_counter() - start, "timeout"
+
+
+async def _run_level(base_url: str, pdfs: list, concurrency: int, timeout: float) -> dict:
+    status_samples = []
+    limits = httpx.Limits(max_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            _run_job(client, pdfs[i % len(pdfs)], f"bench_{concurrency}_{i}.pdf", status_samples, timeout)
+            for i in range(concurrency)
+        ])
+        wall = time.perf_counter() - start
+    latencies = [latency for latency, _ in results]
+    outcomes = {}
+    for _, status in results:
+        outcomes[status] = outcomes.get(status, 0) + 1
+    return {
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "jobs_per_s": concurrency / wall if wall else 0.0,
+        "job_p50_ms": 1000 * percentile(latencies, 50),
+        "job_p99_ms": 1000 * percentile(latencies, 99),
+        "outcomes": outcomes,
+        "status_poll": summarize(status_samples),
+    }
+
+
+def run_load_test(workdir: str, levels=CONCURRENCY_LEVELS, pages: int = 20, workers: int = 4,
+                  llm_latency_ms: float = 50, job_timeout: float = 600) -> dict:
+    pdf_paths = []
+    for seed in range(8):
+        path = os.path.join(workdir, f"load_{seed}.pdf")
+        write_pdf(path, pages, seed=seed)
+        pdf_paths.append(path)
+    pdfs = [open(path, "rb").read() for path in pdf_paths]
+
+    proc, base_url = start_server(workdir, workers, llm_latency_ms)
+    try:
+        levels_out = [asyncio.run(_run_level(base_url, pdfs, c, job_timeout)) for c in levels]
+        peak = process_tree_peak_rss_mb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {"pages": pages, "workers": workers, "llm_latency_ms": llm_latency_ms,
+            "levels": levels_out, "server_peak_rss_mb": peak}
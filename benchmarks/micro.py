@@ -0,0 +1,180 @@
+## Microbenchmarks: extraction, read_data_tool, InvestmentTool, database helpers and the LLM budget
+import os
+import time
+import queue
+import multiprocessing
+
+from benchmarks.common import summarize, timed, peak_rss_mb
+from benchmarks.synthetic_pdf import write_pdf
+
+PAGE_COUNTS = (10, 100, 1000)
+
+
+def bench_extraction(page_counts=PAGE_COUNTS, repeat: int = 3) -> dict:
+    from cache import ExtractionCache, file_sha256
+    import extraction
+
+    os.makedirs("data", exist_ok=True)
+    results = {}
+    for pages in page_counts:
+        path = f"data/synthetic_{pages}.pdf"
+        write_pdf(path, pages, seed=pages)
+        digest = file_sha256(path)
+        def read_cold():
+            # A fresh cache each time, so every iteration starts with empty memory accounting
+            cold = ExtractionCache(cache_dir=f"cache/cold_{pages}")
+            cold.put(digest, extraction.extract_text(path))
+
+        warm = ExtractionCache(cache_dir=f"cache/cold_{pages}")
+        warm.put(digest, extraction.extract_text(path))
+
+        results[f"{pages}_pages"] = {
+            "extract_sequential": summarize(timed(lambda: extraction.extract_text(path, parallel=False), repeat)),
+            "extract_parallel": summarize(timed(lambda: extraction.extract_text(path), repeat)),
+            "read_cold": summarize(timed(read_cold, repeat)),
+            "read_cached": summarize(timed(lambda: warm.get(digest), repeat * 10)),
+            "pages_per_s": pages / min(timed(lambda: extraction.extract_text(path), 1)),
+        }
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def _extract_in_worker(path: str, results):
+    import extraction
+    results.put(len(extraction.load_document_text(path)))
+
+
+def bench_worker_extraction(pages: int = 100, extraction_workers: int = 2) -> dict:
+    """Extracts a large PDF inside a process started exactly like a queue worker.
+
+    Documents of at least EXTRACTION_PARALLEL_MIN_PAGES pages use the extraction process
+    pool, which must be able to start from within a worker process.
+    """
+    import worker
+
+    os.makedirs("data", exist_ok=True)
+    path = f"data/synthetic_{pages}.pdf"
+    if not os.path.exists(path):
+        write_pdf(path, pages, seed=pages)
+    previous = os.environ.get("EXTRACTION_WORKERS")
+    os.environ["EXTRACTION_WORKERS"] = str(extraction_workers)  # inherited by the child
+    try:
+        results = multiprocessing.get_context("spawn").Queue()
+        start = time.perf_counter()
+        proc = worker.spawn_process(_extract_in_worker, (os.path.abspath(path), results))
+        try:
+            # Read before joining: a child exits only once its queued result is consumed
+            chars = results.get(timeout=600)
+        except queue.Empty:
+            chars = None
+        proc.join()
+        wall = time.perf_counter() - start
+    finally:
+        if previous is None:
+            os.environ.pop("EXTRACTION_WORKERS")
+        else:
+            os.environ["EXTRACTION_WORKERS"] = previous
+    if proc.exitcode != 0 or chars is None:
+        raise RuntimeError(f"extraction in a worker process exited with code {proc.exitcode}")
+    return {"pages": pages, "chars": chars, "wall_s": wall}
+
+
+def bench_read_data_tool(pages: int = 100, repeat: int = 5) -> dict:
+    """Times the CrewAI tool entry point itself (requires crewai)."""
+    from tools import read_data_tool
+    from cache import extraction_cache
+
+    path = f"data/synthetic_{pages}.pdf"
+    if not os.path.exists(path):
+        write_pdf(path, pages, seed=pages)
+    first = timed(lambda: read_data_tool.run(path=path), 1)
+    warm = timed(lambda: read_data_tool.run(path=path), repeat)
+    return {"first_call": summarize(first), "warm": summarize(warm), "cache": extraction_cache.stats()}
+
+
+def bench_investment_tool(pages: int = 100, repeat: int = 20) -> dict:
+    """Times InvestmentTool/RiskTool on extracted report text (requires crewai)."""
+    from extraction import extract_text
+    from tools import InvestmentTool, RiskTool
+
+    path = f"data/synthetic_{pages}.pdf"
+    if not os.path.exists(path):
+        write_pdf(path, pages, seed=pages)
+    text = extract_text(path)
+    investment, risk = InvestmentTool(), RiskTool()
+    return {
+        "chars": len(text),
+        "analyze_investment_tool": summarize(timed(lambda: investment.analyze_investment_tool(text), repeat)),
+        "create_risk_assessment_tool": summarize(timed(lambda: risk.create_risk_assessment_tool(text), repeat)),
+    }
+
+
+def bench_database(n: int = 500) -> dict:
+    import database as db_mod
+
+    db = db_mod.SessionLocal()
+    try:
+        start = time.perf_counter()
+        task_ids = [db_mod.create_task(db, f"doc{i}.pdf", "bench query", file_path=f"data/doc{i}.pdf",
+                                       content_hash=f"hash{i}") for i in range(n)]
+        create = time.perf_counter() - start
+
+        claim_samples = timed(lambda: db_mod.claim_next_task(db, "bench-worker", {"default": n}), min(n, 200))
+
+        start = time.perf_counter()
+        for task_id in task_ids:
+            db_mod.update_task_result(db, task_id, "{}", "", "completed")
+        update = time.perf_counter() - start
+
+        lookup = timed(lambda: db_mod.find_reusable_task(db, "hash7", "bench query"), 200)
+    finally:
+        db.close()
+    return {
+        "create_task": summarize([create / n] * n),
+        "claim_next_task": summarize(claim_samples),
+        "update_task_result": summarize([update / n] * n),
+        "find_reusable_task": summarize(lookup),
+    }
+
+
+def bench_rate_limiter(rpm: float = 600, seconds: float = 6.0, layouts=((2, 8), (4, 2), (8, 2)),
+                       min_utilization: float = 0.85) -> dict:
+    """Grants per layout of (jobs, callers per job) competing for an `rpm` budget.
+
+    The bucket starts empty, so a run can use at most `rpm * seconds / 60` grants;
+    raises if any layout leaves more than `1 - min_utilization` of that unused.
+    """
+    import threading
+    from rate_limiter import BudgetScheduler
+
+    results = {}
+    for jobs, callers in layouts:
+        scheduler = BudgetScheduler(path=f"cache/budget_{jobs}x{callers}.db", rpm=rpm, tpm=1e9)
+        with scheduler._conn() as conn:
+            conn.execute("UPDATE budget SET requests = 0, tokens = 0, updated_at = ?", (time.time(),))
+        grants = {f"job{j}": 0 for j in range(jobs)}
+        lock = threading.Lock()
+        deadline = time.time() + seconds
+
+        def call(job_id):
+            while True:
+                scheduler.acquire(100, job_id=job_id)
+                if time.time() >= deadline:
+                    return
+                with lock:
+                    grants[job_id] += 1
+
+        threads = [threading.Thread(target=call, args=(job_id,)) for job_id in grants for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        available = rpm * seconds / 60
+        utilization = sum(grants.values()) / available
+        results[f"{jobs}x{callers}"] = {"grants": sum(grants.values()), "available": available,
+                                        "utilization": utilization,
+                                        "min_job_grants": min(grants.values()), "max_job_grants": max(grants.values())}
+        if utilization < min_utilization:
+            raise RuntimeError(f"{jobs} jobs x {callers} callers used {utilization:.0%} of the budget")
+    return results
@@ -0,0 +1,104 @@
+## Benchmark runner
+# Runs the offline benchmark suites and writes results as JSON so regressions can be
+# tracked over time. No network or API key is needed: the crew uses the fake LLM.
+#
+#     python -m benchmarks.run                       # all suites
+#     python -m benchmarks.run --suites micro --pages 10 100
+#     python -m benchmarks.run --compare benchmarks/results/previous.json
+import os
+import sys
+import json
+import argparse
+import platform
+import traceback
+from datetime import datetime
+
+from benchmarks.common import REPO_ROOT, enter_sandbox
+
+SUITES = ("extraction", "worker_extraction", "read_data_tool", "investment_tool", "database", "rate_limiter", "load")
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+
+def _flatten(data, prefix=""):
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from _flatten(value, f"{prefix}{key}.")
+    elif isinstance(data, list):
+        for i, value in enumerate(data):
+            yield from _flatten(value, f"{prefix}{i}.")
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        yield prefix.rstrip("."), data
+
+
+def compare(current: dict, baseline: dict):
+    """Prints metrics that moved by more than 10% against a previous results file."""
+    old = dict(_flatten(baseline.get("suites", {})))
+    for key, value in _flatten(current.get("suites", {})):
+        before = old.get(key)
+        if not before or not key.endswith(("_ms", "_per_s", "_mb", "wall_s")):
+            continue
+        change = 100.0 * (value - before) / abs(before)
+        if abs(change) >= 10:
+            print(f"{key}: {before:.2f} -> {value:.2f} ({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--pages", nargs="+", type=int, default=[10, 100, 1000])
+    parser.add_argument("--levels", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Previous results JSON to diff against")
+    args = parser.parse_args(argv)
+
+    # Paths are relative to where the runner was started, not to the sandbox it moves into
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    # Offline by construction: every suite that touches the crew uses the fake LLM
+    os.environ["LLM_BACKEND"] = "fake"
+    sandbox = enter_sandbox()
+
+    from benchmarks import micro, load_test
+
+    runners = {
+        "extraction": lambda: micro.bench_extraction(args.pages),
+        "worker_extraction": lambda: micro.bench_worker_extraction(max(100, max(args.pages))),
+        "read_data_tool": lambda: micro.bench_read_data_tool(min(args.pages)),
+        "investment_tool": lambda: micro.bench_investment_tool(min(args.pages)),
+        "database": micro.bench_database,
+        "rate_limiter": micro.bench_rate_limiter,
+        "load": lambda: load_test.run_load_test(sandbox, args.levels, workers=args.workers,
+                                                llm_latency_ms=args.llm_latency_ms),
+    }
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "suites": {},
+    }
+    for suite in args.suites:
+        print(f"Running {suite}...", flush=True)
+        try:
+            results["suites"][suite] = runners[suite]()
+        except Exception as e:
+            traceback.print_exc()
+            results["suites"][suite] = {"error": f"{type(e).__name__}: {e}"}
+
+    output = output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline:
+        with open(baseline) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+## Synthetic financial-report PDFs for benchmarking
+# Writes valid text PDFs directly (no extra dependencies). Page 1-3 hold an income
+# statement, balance sheet and cash-flow statement the metric extractor can parse; the
+# remaining pages are MD&A-style filler so extraction cost scales with page count.
+import random
+
+_FILLER = (
+    "Management's discussion and analysis of financial condition and results of operations. "
+    "Revenue increased primarily due to higher volumes and pricing. Liquidity remains adequate "
+    "to fund operations, capital expenditures and debt service over the next twelve months. "
+    "Risk factors include interest rate changes, foreign exchange and supply chain disruption."
+)
+
+_STATEMENTS = [
+    ["Consolidated Statements of Operations", "2024 2023",
+     "Total revenues {rev} {rev_prev}", "Cost of revenues {cogs} {cogs_prev}",
+     "Income from operations {op} {op_prev}", "Interest expense ({int_exp}) ({int_exp_prev})",
+     "Net income {ni} {ni_prev}"],
+    ["Consolidated Balance Sheets", "2024 2023",
+     "Inventories {inv} {inv_prev}", "Total current assets {ca} {ca_prev}",
+     "Total assets {ta} {ta_prev}", "Total current liabilities {cl} {cl_prev}",
+     "Long-term debt {ltd} {ltd_prev}", "Total stockholders' equity {eq} {eq_prev}"],
+    ["Consolidated Statements of Cash Flows", "2024 2023",
+     "Net cash provided by operating activities {ocf} {ocf_prev}",
+     "Purchases of property and equipment ({capex}) ({capex_prev})"],
+]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _figures(rng: random.Random) -> dict:
+    base = rng.randint(5_000, 50_000)
+    values = {}
+    for key, scale in (("rev", 1.0), ("cogs", 0.6), ("op", 0.15), ("int_exp", 0.01), ("ni", 0.1),
+                       ("inv", 0.1), ("ca", 0.5), ("ta", 2.0), ("cl", 0.35), ("ltd", 0.4),
+                       ("eq", 0.9), ("ocf", 0.18), ("capex", 0.07)):
+        values[key] = f"{int(base * scale * rng.uniform(0.9, 1.1)):,}"
+        values[f"{key}_prev"] = f"{int(base * scale * rng.uniform(0.8, 1.0)):,}"
+    return values
+
+
+def page_lines(page_no: int, figures: dict, rng: random.Random) -> list:
+    if page_no < len(_STATEMENTS):
+        return [line.format(**figures) for line in _STATEMENTS[page_no]]
+    words = _FILLER.split()
+    lines = []
+    for _ in range(40):
+        rng.shuffle(words)
+        lines.append(" ".join(words[:14]))
+    return [f"Page {page_no + 1}"] + lines
+
+
+def write_pdf(path: str, pages: int, seed: int = 0):
+    """Writes a `pages`-page text PDF to `path`."""
+    rng = random.Random(seed)
+    figures = _figures(rng)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_no in range(pages):
+        ops = ["BT", "/F1 9 Tf", "11 TL", "50 760 Td"]
+        for line in page_lines(page_no, figures, rng):
+            ops.append(f"({_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        " ".join(f"{k} 0 R" for k in kids).encode(), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
@@ -0,0 +1,185 @@
+## Content-addressed cache for extracted document text
+# Every crew run calls `read_data_tool` once per task (plus agent retries), and each
+# call used to re-parse the whole PDF. Extracted text is cached here keyed on a hash
+# of the file *contents*, so re-uploads of the same report across jobs hit too.
+import os
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+load_dotenv()
+
+CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "cache/extractions")
+MAX_MEMORY_BYTES = int(os.getenv("EXTRACTION_CACHE_MEMORY_MB", "256")) * 1024 * 1024
+MAX_DISK_BYTES = int(os.getenv("EXTRACTION_CACHE_DISK_MB", "2048")) * 1024 * 1024
+
+# Bump when the extraction/normalization output changes so stale entries are ignored
+EXTRACTOR_VERSION = "1"
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# (path, size, mtime_ns) -> sha256, so unchanged files are not re-hashed on every tool call
+_digest_memo = {}
+_digest_lock = threading.Lock()
+
+
+def file_sha256(path: str) -> str:
+    """Returns the hex SHA-256 of a file's contents, memoized on (path, size, mtime)."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_memo.get(memo_key)
+    if digest is not None:
+        return digest
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _digest_lock:
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+def remember_digest(path: str, digest: str):
+    """Seeds the digest memo for a file whose hash was computed elsewhere (e.g. while uploading)."""
+    stat = os.stat(path)
+    with _digest_lock:
+        _digest_memo[(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)] = digest
+
+
+class ExtractionCache:
+    """Two-level (memory LRU + on-disk) cache of extracted text keyed on content hash.
+
+    Both layers are size-bound: the memory layer evicts least-recently-used entries,
+    the disk layer evicts the files with the oldest access time.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_memory_bytes: int = MAX_MEMORY_BYTES,
+                 max_disk_bytes: int = MAX_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None  # computed lazily on first write
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    def _key(self, digest: str) -> str:
+        return f"{digest}-v{EXTRACTOR_VERSION}"
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def get(self, digest: str):
+        key = self._key(digest)
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return text
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)  # refresh access time for disk LRU
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, text)
+        return text
+
+    def put(self, digest: str, text: str):
+        key = self._key(digest)
+        with self._lock:
+            self._remember(key, text)
+        self._write_disk(key, text)
+
+    def _remember(self, key: str, text: str):
+        # Bytes the string actually occupies (1, 2 or 4 per character), not its length
+        size = sys.getsizeof(text)
+        if size > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= sys.getsizeof(old)
+        self._memory[key] = text
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= sys.getsizeof(evicted)
+            self.evictions += 1
+
+    def _write_disk(self, key: str, text: str):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so concurrent workers never read a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+            else:
+                self._disk_bytes += os.path.getsize(path)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _scan_disk(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".txt"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_atime
+
+    def _evict_disk(self):
+        entries = sorted(self._scan_disk(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self._disk_bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+            }
+
+
+# Shared per-process instance used by `read_data_tool`
+extraction_cache = ExtractionCache()
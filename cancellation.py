@@ -0,0 +1,78 @@
+## Job cancellation and deadlines
+# Each running job gets a `JobControl`, installed in a context variable for the whole
+# job (stage threads inherit it through `contextvars.copy_context()`). The pipeline
+# checks it between stages and `CachedLLM.call` before every LLM request, so a job
+# stops at the next boundary once it is cancelled (`DELETE /tasks/{task_id}`), timed
+# out by the reaper, or past its own deadline.
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+import database as db_mod
+
+STAGE_TIMEOUT_SECONDS = float(os.getenv("STAGE_TIMEOUT_SECONDS", "600"))
+# How often a running job re-reads its status to notice cancellation
+CANCEL_POLL_SECONDS = float(os.getenv("CANCEL_POLL_SECONDS", "1.0"))
+
+
+class JobStopped(Exception):
+    """Raised inside a job that must stop; `status` is the job's final state."""
+
+    def __init__(self, status: str, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+class JobControl:
+    def __init__(self, task_id: str, timeout: float = db_mod.JOB_TIMEOUT_SECONDS):
+        self.task_id = task_id
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self._stopped = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def stop(self, status: str, reason: str):
+        """Marks the job stopped; the first reason wins."""
+        with self._lock:
+            if self._stopped is None:
+                self._stopped = (status, reason)
+
+    def check(self):
+        """Raises JobStopped if the job was stopped, cancelled, timed out or is past its deadline."""
+        if self._stopped is None:
+            now = time.monotonic()
+            if now >= self.deadline:
+                self.stop("timed_out", f"job exceeded its {self.timeout:g}s deadline")
+            elif now - self._checked_at >= CANCEL_POLL_SECONDS:
+                self._checked_at = now
+                with db_mod.session_scope() as db:
+                    status = db_mod.get_task_status(db, self.task_id)
+                if status not in db_mod.ACTIVE_STATUSES:
+                    self.stop(status or "cancelled", f"job was {status or 'deleted'}")
+        if self._stopped is not None:
+            raise JobStopped(*self._stopped)
+
+
+current_control = contextvars.ContextVar("current_control", default=None)
+
+
+def check_current():
+    """Checks the current job's control, if any (no-op outside a job)."""
+    control = current_control.get()
+    if control is not None:
+        control.check()
+
+
+@contextmanager
+def job_control(task_id: str, timeout: float = db_mod.JOB_TIMEOUT_SECONDS):
+    """Installs a JobControl for `task_id` for the duration of the block."""
+    control = JobControl(task_id, timeout)
+    token = current_control.set(control)
+    try:
+        yield control
+    finally:
+        current_control.reset(token)
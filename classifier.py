@@ -0,0 +1,150 @@
+## Local fast-path document verification
+# Decides in milliseconds, without any LLM call, whether a document is clearly a
+# financial report (all three core statements present, strong financial vocabulary,
+# parseable line items), clearly not one (receipts, random PDFs, image-only scans), or
+# ambiguous. Only ambiguous documents go on to the LLM `verification` task; the other
+# two produce the same JSON shape that task returns.
+import os
+import re
+import math
+
+from metrics import parse_line_items
+from retrieval import tokenize
+
+VERIFICATION_FAST_PATH = os.getenv("VERIFICATION_FAST_PATH", "1") == "1"
+PASS_PROBABILITY = 0.9
+FAIL_PROBABILITY = 0.2
+MIN_TEXT_CHARS = 200
+MIN_LINE_ITEMS = 4
+
+SECTION_HEADINGS = {
+    "Income Statement": re.compile(
+        r"(statements? of (consolidated )?(operations|income|earnings)|income statements?|"
+        r"profit (and|&) loss)", re.I),
+    "Balance Sheet": re.compile(r"(balance sheets?|statements? of (consolidated )?financial (position|condition))", re.I),
+    "Cash Flow": re.compile(r"(statements? of (consolidated )?cash flows?|cash flows? statements?)", re.I),
+    "MD&A": re.compile(r"management['’]?s discussion (and|&) analysis", re.I),
+}
+CORE_SECTIONS = ("Income Statement", "Balance Sheet", "Cash Flow")
+
+DOCUMENT_TYPES = (
+    ("10-K", re.compile(r"form\s+10-k\b", re.I)),
+    ("10-Q", re.compile(r"form\s+10-q\b", re.I)),
+    ("Earnings Release", re.compile(r"(earnings release|press release|reports? (first|second|third|fourth|full[- ]year) quarter)", re.I)),
+    ("Annual Report", re.compile(r"annual report", re.I)),
+)
+_ENTITY = re.compile(
+    r"^\s*([A-Z][A-Za-z0-9&.,'’ -]{1,60}?\b(?:Inc|Corp|Corporation|Company|Co|Ltd|Limited|plc|PLC|LLC|Group|Holdings|N\.V|S\.A|AG|SE)\.?)(?=\s|,|$)",
+    re.M)
+_PERIOD = re.compile(
+    r"(fiscal )?(year|quarter|three months|six months|nine months|twelve months) ended\s+"
+    r"([A-Z][a-z]+ \d{1,2},? (?:19|20)\d{2})", re.I)
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+
+# Keyword model: per-term log-odds weights applied to log(1 + occurrences per 1,000
+# tokens). Positive terms are typical of financial statements, negative ones of
+# receipts, invoices and unrelated documents.
+KEYWORD_WEIGHTS = {
+    "revenue": 0.6, "revenues": 0.6, "sales": 0.3, "income": 0.4, "net": 0.2, "assets": 0.6,
+    "liabilities": 0.6, "equity": 0.5, "stockholders": 0.5, "shareholders": 0.5, "cash": 0.2,
+    "operating": 0.4, "activities": 0.3, "depreciation": 0.5, "amortization": 0.5,
+    "earnings": 0.4, "share": 0.2, "diluted": 0.6, "fiscal": 0.4, "consolidated": 0.6,
+    "quarter": 0.2, "debt": 0.3, "interest": 0.2, "expenses": 0.3, "gaap": 0.6,
+    "receipt": -1.2, "invoice": -0.8, "subtotal": -1.2, "cashier": -1.5, "qty": -1.2,
+    "thank": -0.6, "change": -0.1, "item": -0.2, "order": -0.3, "shipping": -0.6,
+    "chapter": -0.8, "recipe": -1.5, "lorem": -1.5, "ipsum": -1.5,
+}
+BIAS = -3.0
+SECTION_WEIGHT = 1.2
+LINE_ITEM_WEIGHT = 0.35
+NUMERIC_WEIGHT = 4.0
+
+
+def _probability(tokens: list, sections_found: list, line_items: int) -> float:
+    """Logistic score over keyword densities, section headings and parsed line items."""
+    per_thousand = 1000.0 / max(len(tokens), 1)
+    counts = {}
+    for token in tokens:
+        if token in KEYWORD_WEIGHTS:
+            counts[token] = counts.get(token, 0) + 1
+    score = BIAS
+    score += sum(KEYWORD_WEIGHTS[t] * math.log1p(n * per_thousand) for t, n in counts.items())
+    score += SECTION_WEIGHT * sum(1 for s in sections_found if s in CORE_SECTIONS)
+    score += LINE_ITEM_WEIGHT * min(line_items, 10)
+    numeric_share = sum(1 for t in tokens if t[0].isdigit()) / max(len(tokens), 1)
+    score += NUMERIC_WEIGHT * min(numeric_share, 0.4)
+    return 1.0 / (1.0 + math.exp(-score))
+
+
+def _document_type(head: str) -> str:
+    for name, pattern in DOCUMENT_TYPES:
+        if pattern.search(head):
+            return name
+    return "Other"
+
+
+def _reporting_period(text: str) -> str:
+    match = _PERIOD.search(text)
+    if match:
+        kind = "FY" if match.group(2).lower() in ("year", "twelve months") else "Period"
+        return f"{kind} ended {match.group(3)}"
+    years = _YEAR.findall(text[:20000])
+    return f"FY {max(years)}" if years else ""
+
+
+def _anomalies(parsed: dict) -> list:
+    anomalies = []
+    items = parsed["items"]
+    assets, liabilities, equity = items.get("total_assets"), items.get("total_liabilities"), items.get("equity")
+    if assets is not None and liabilities is not None and equity is not None and assets.size and liabilities.size and equity.size:
+        gap = abs(assets[0] - liabilities[0] - equity[0])
+        if assets[0] and gap / abs(assets[0]) > 0.02:
+            anomalies.append("Balance sheet does not balance: total assets differ from liabilities plus equity")
+    return anomalies
+
+
+def reporting_entity(text: str) -> str:
+    """Returns the company name from the document's opening text, or ""."""
+    match = _ENTITY.search(text[:5000])
+    return match.group(1).strip() if match else ""
+
+
+def classify_document(text: str) -> tuple:
+    """Returns (decision, report): decision is "passed", "failed" or "ambiguous".
+
+    `report` has the same fields as the `verification` task's JSON output.
+    """
+    sections_found = [name for name, pattern in SECTION_HEADINGS.items() if pattern.search(text)]
+    report = {
+        "is_financial_document": False,
+        "document_type": "Other",
+        "reporting_entity": "",
+        "reporting_period": "",
+        "sections_found": sections_found,
+        "sections_missing": [name for name in SECTION_HEADINGS if name not in sections_found],
+        "anomalies_detected": [],
+        "verification_status": "FAILED",
+    }
+    if len(text.strip()) < MIN_TEXT_CHARS:
+        report["anomalies_detected"].append("No extractable text (empty, scanned or image-only PDF)")
+        return "failed", report
+
+    head = text[:5000]
+    parsed = parse_line_items(text)
+    line_items = len(parsed["items"])
+    probability = _probability(tokenize(text), sections_found, line_items)
+    report.update(
+        document_type=_document_type(head),
+        reporting_entity=reporting_entity(text),
+        reporting_period=_reporting_period(text),
+        anomalies_detected=_anomalies(parsed),
+    )
+
+    has_core = all(s in sections_found for s in CORE_SECTIONS)
+    if has_core and line_items >= MIN_LINE_ITEMS and probability >= PASS_PROBABILITY:
+        report.update(is_financial_document=True, verification_status="PARTIAL" if report["anomalies_detected"] else "PASSED")
+        return "passed", report
+    if not any(s in sections_found for s in CORE_SECTIONS) and line_items == 0 and probability <= FAIL_PROBABILITY:
+        report["anomalies_detected"].append(f"No financial statements found (financial-language score {probability:.2f})")
+        return "failed", report
+    return "ambiguous", report
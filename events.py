@@ -0,0 +1,154 @@
+## Job progress events and in-process pub/sub
+# Workers (possibly in other processes) append events to the `job_events` table via
+# `publish`. In the API process a single relay tails that table — only while someone
+# is listening — and fans new events out to per-job subscriber queues, so hundreds of
+# SSE clients cost one query per tick instead of one `/status` poll each.
+import os
+import json
+import asyncio
+
+import database as db_mod
+
+RELAY_INTERVAL = float(os.getenv("EVENT_RELAY_INTERVAL", "0.5"))
+HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15"))
+TERMINAL_EVENTS = ("completed", "failed", "cancelled", "timed_out")
+RELAY_BATCH = 500
+# Postgres hands out ids at insert time but transactions commit out of order, so an event
+# can become visible below ids the relay has already passed; the relay re-reads this many
+# ids behind its position. SQLite serializes writers, so its ids become visible in order.
+RELAY_LOOKBACK = int(os.getenv("EVENT_RELAY_LOOKBACK", "0" if db_mod.IS_SQLITE else "1000"))
+
+
+def publish(task_id: str, event: str, data: dict = None):
+    """Records a progress event for `task_id` (safe to call from worker threads)."""
+    db = db_mod.SessionLocal()
+    try:
+        db_mod.add_job_event(db, task_id, event, data)
+    except Exception as e:
+        # Progress reporting must never fail the job itself
+        print(f"Failed to publish {event} for {task_id}: {e}")
+    finally:
+        db.close()
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers = {}  # task_id -> set of asyncio.Queue
+        self._last_id = None
+        self._delivered = set()  # ids within the lookback window already fanned out
+        self._relay = None
+
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        if self._relay is None or self._relay.done():
+            self._relay = asyncio.get_running_loop().create_task(self._run_relay())
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(task_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[task_id]
+
+    async def ensure_started(self):
+        """Pins the relay's starting point; history replayed after this cannot leave a gap."""
+        if self._last_id is None:
+            self._last_id = await asyncio.to_thread(self._current_id)
+
+    def _current_id(self) -> int:
+        db = db_mod.SessionLocal()
+        try:
+            return db_mod.last_job_event_id(db)
+        finally:
+            db.close()
+
+    def _poll(self, after_id: int, task_ids: list):
+        db = db_mod.SessionLocal()
+        try:
+            upto_id = db_mod.last_job_event_id(db)
+            # The lookback window holds at most RELAY_LOOKBACK rows, so a full batch still advances
+            limit = RELAY_BATCH + RELAY_LOOKBACK
+            events = db_mod.get_job_events(db, max(0, after_id - RELAY_LOOKBACK), task_ids=task_ids,
+                                           upto_id=upto_id, limit=limit)
+            # Skip past events for jobs nobody is watching unless the batch was truncated
+            next_id = events[-1].id if len(events) == limit else upto_id
+            return next_id, [(e.id, e.task_id, e.event, e.data) for e in events]
+        finally:
+            db.close()
+
+    async def _run_relay(self):
+        await self.ensure_started()
+        while self._subscribers:
+            next_id, events = await asyncio.to_thread(self._poll, self._last_id, list(self._subscribers))
+            self._last_id = max(self._last_id, next_id)
+            for event in events:
+                if event[0] in self._delivered:
+                    continue
+                if RELAY_LOOKBACK:
+                    self._delivered.add(event[0])
+                for queue in list(self._subscribers.get(event[1], ())):
+                    queue.put_nowait(event)
+            window_start = self._last_id - RELAY_LOOKBACK
+            self._delivered = {event_id for event_id in self._delivered if event_id > window_start}
+            await asyncio.sleep(RELAY_INTERVAL)
+        self._last_id = None
+        self._delivered.clear()
+
+
+bus = EventBus()
+
+
+def _format_sse(event_id: int, event: str, data: str) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+def _history(task_id: str, after_id: int) -> list:
+    db = db_mod.SessionLocal()
+    try:
+        return [(e.id, e.task_id, e.event, e.data)
+                for e in db_mod.get_job_events(db, after_id, task_ids=[task_id], limit=10000)]
+    finally:
+        db.close()
+
+
+async def stream_events(task_id: str, last_event_id: int = 0):
+    """Async generator of SSE frames for one job, resuming after `last_event_id`."""
+    queue = bus.subscribe(task_id)
+    try:
+        # Subscribe before replaying history so nothing falls in the gap; dedupe by id
+        # (not by the highest id: on Postgres, ids can arrive out of order)
+        await bus.ensure_started()
+        replayed = set()
+        for event_id, _, event, data in await asyncio.to_thread(_history, task_id, last_event_id):
+            replayed.add(event_id)
+            yield _format_sse(event_id, event, data)
+            if event in TERMINAL_EVENTS:
+                return
+
+        while True:
+            try:
+                event_id, _, event, data = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if event_id <= last_event_id or event_id in replayed:
+                continue
+            replayed.add(event_id)
+            yield _format_sse(event_id, event, data)
+            if event in TERMINAL_EVENTS:
+                return
+    finally:
+        bus.unsubscribe(task_id, queue)
+
+
+def step_summary(step) -> dict:
+    """Compact, JSON-safe description of a CrewAI agent step for progress events."""
+    summary = {"type": type(step).__name__}
+    for attr in ("tool", "tool_input", "thought", "result", "output", "text"):
+        value = getattr(step, attr, None)
+        if value:
+            summary[attr] = str(value)[:500]
+    return summary
+
@@ -0,0 +1,67 @@
+## Cross-document metric history per reporting entity
+# Each completed analysis writes its deterministic line items and ratios (from
+# `metrics.py`) to the `metric_points` table, keyed by entity, fiscal year and metric.
+# Later jobs on the same company get the earlier periods injected into the analysis
+# task, and `/companies/{company}/metrics` serves multi-period series in one query.
+import os
+import re
+
+import database as db_mod
+from metrics import analyze_text
+
+PRIOR_PERIODS = int(os.getenv("HISTORY_PRIOR_PERIODS", "5"))
+_FISCAL_YEAR = re.compile(r"^(?:19|20)\d{2}$")
+
+NO_HISTORY = "None on record."
+
+
+def metric_points(text: str) -> tuple:
+    """Returns (periods, [(period, metric, value)]) for every year column in the report.
+
+    A year heading more than one column (a 10-Q's "2024 2023 2024 2023": quarter, then
+    year-to-date) means the columns are not fiscal years, so no points are returned.
+    """
+    analysis = analyze_text(text)
+    periods = analysis["periods"]
+    years = [p for p in periods if _FISCAL_YEAR.match(p)]
+    if len(set(years)) != len(years):
+        return sorted(set(years), reverse=True), []
+    points = []
+    for group in ("line_items", "ratios"):
+        for metric, values in analysis[group].items():
+            for period, value in zip(periods, values):
+                if value is not None and _FISCAL_YEAR.match(period):
+                    points.append((period, metric, value))
+    return years, points
+
+
+def record_analysis(db, entity_name: str, text: str, task_id: str, content_hash: str) -> int:
+    _, points = metric_points(text)
+    return db_mod.record_metric_points(db, entity_name, points, task_id, content_hash)
+
+
+def prior_periods_context(db, entity_name: str, text: str, content_hash: str) -> str:
+    """Formats the entity's recorded periods older than this document's for the prompt."""
+    if not entity_name:
+        return NO_HISTORY
+    periods, _ = metric_points(text)
+    end = str(int(min(periods)) - 1) if periods else None
+    start = str(int(end) - PRIOR_PERIODS + 1) if end else None
+    rows = db_mod.get_metric_series(db, entity_name, start=start, end=end, exclude_hash=content_hash)
+    if not rows:
+        return NO_HISTORY
+    series = {}
+    for row in rows:
+        series.setdefault(row.metric, []).append(f"{row.period}: {row.value:g}")
+    return "\n".join(f"- {metric}: {', '.join(values)}" for metric, values in series.items())
+
+
+def series_table(rows: list) -> dict:
+    """Pivots MetricPoint rows into {"periods": [...], "series": {metric: {period: value}}}."""
+    series = {}
+    for row in rows:
+        series.setdefault(row.metric, {})[row.period] = row.value
+    return {
+        "periods": sorted({row.period for row in rows}),
+        "series": series,
+    }
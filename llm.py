@@ -0,0 +1,171 @@
+## LLM client construction
+# CrewAI converts any LangChain chat model into its own litellm-backed `LLM`, so the
+# cache hooks in at that level: `CachedLLM.call` consults the response store before
+# handing the request to the provider, and every provider request goes through the
+# global budget scheduler in `rate_limiter.py`. Each call is traced with its latency,
+# estimated token counts and whether it was served from the cache.
+import os
+import json
+import time
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+from crewai import LLM
+
+import llm_cache
+from cancellation import check_current
+from telemetry import registry, span
+from rate_limiter import get_scheduler, current_job, estimate_tokens, is_rate_limit_error, MAX_RATE_LIMIT_RETRIES, COMPLETION_TOKEN_RESERVE
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.2"))
+# "openai" (default) or "fake" — the deterministic offline stand-in used by benchmarks
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "600"))
+
+
+class CachedLLM(LLM):
+    """CrewAI LLM with a pluggable response cache and record/replay support."""
+
+    def __init__(self, *args, cache_store=None, cache_mode: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_mode = cache_mode or llm_cache.LLM_CACHE_MODE
+        if self.cache_mode not in llm_cache.CACHE_MODES:
+            raise ValueError(f"Unknown LLM_CACHE_MODE '{self.cache_mode}', expected one of {llm_cache.CACHE_MODES}")
+        self._cache_store = cache_store
+
+    @property
+    def cache_store(self):
+        if self._cache_store is None:
+            self._cache_store = llm_cache.get_store()
+        return self._cache_store
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        # Stop a cancelled or overdue job before spending another request on it
+        check_current()
+        prompt_tokens = estimate_tokens(messages)
+        started = time.perf_counter()
+        with span("llm.call", **{"llm.model": self.model, "llm.prompt_tokens": prompt_tokens,
+                                 "job.id": current_job.get()}) as current:
+            response, cache_hit = self._cached_call(messages, tools, callbacks, available_functions)
+            completion_tokens = estimate_tokens(str(response))
+            current.set_attribute("llm.cache_hit", cache_hit)
+            current.set_attribute("llm.completion_tokens", completion_tokens)
+
+        cache = "hit" if cache_hit else "miss"
+        registry.observe("fda_llm_request_duration_seconds", time.perf_counter() - started, cache=cache)
+        registry.inc("fda_llm_requests_total", cache=cache)
+        if not cache_hit:
+            registry.inc("fda_llm_tokens_total", prompt_tokens, direction="prompt")
+            registry.inc("fda_llm_tokens_total", completion_tokens, direction="completion")
+        return response
+
+    def _cached_call(self, messages, tools, callbacks, available_functions) -> tuple:
+        """Returns (response, served_from_cache)."""
+        # Responses that execute functions have side effects; never cache those
+        if self.cache_mode == "off" or available_functions:
+            return self._provider_call(messages, tools, callbacks, available_functions), False
+
+        key = llm_cache.cache_key(self.model, messages, self.temperature, tools, self.stop)
+        if self.cache_mode in ("cache", "replay"):
+            cached = self.cache_store.get(key)
+            if cached is not None:
+                return cached, True
+            if self.cache_mode == "replay":
+                raise llm_cache.ReplayMissError(f"No recorded response for prompt {key[:12]} (model {self.model})")
+
+        response = self._provider_call(messages, tools, callbacks, available_functions)
+        if isinstance(response, str):
+            self.cache_store.put(key, self.model, response)
+        return response, False
+
+    def _provider_call(self, messages, tools, callbacks, available_functions):
+        """Sends one request to the provider under the shared RPM/TPM budget."""
+        scheduler = get_scheduler()
+        reserved = estimate_tokens(messages) + COMPLETION_TOKEN_RESERVE
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            scheduler.acquire(reserved)
+            try:
+                response = super().call(messages, tools, callbacks, available_functions)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == MAX_RATE_LIMIT_RETRIES:
+                    raise
+                scheduler.record_rate_limited()
+                continue
+            scheduler.record_success()
+            scheduler.settle(reserved, estimate_tokens(messages) + estimate_tokens(str(response)))
+            return response
+
+
+## Deterministic offline stand-in
+# Answers each task with a fixed, schema-shaped JSON "Final Answer" (optionally after a
+# simulated delay), so the whole crew can run without network or API keys.
+FAKE_ANSWERS = {
+    "Document Verification Task": {
+        "is_financial_document": True, "document_type": "10-K", "reporting_entity": "Example Corp",
+        "reporting_period": "FY 2024", "sections_found": ["Income Statement", "Balance Sheet", "Cash Flow"],
+        "sections_missing": [], "anomalies_detected": [], "verification_status": "PASSED",
+    },
+    "Financial Document Analysis Task": {
+        "company": "Example Corp", "reporting_period": "FY 2024", "summary": "Synthetic analysis.",
+        "key_metrics": {}, "key_trends": [], "query_response": "N/A", "risks": [], "opportunities": [],
+    },
+    "Investment Analysis Task": {
+        "investment_stance": "Neutral", "stance_justification": "Synthetic.", "valuation_metrics": {},
+        "short_term_outlook": "", "long_term_outlook": "", "key_catalysts": [], "key_concerns": [],
+        "recommendation": "Hold",
+    },
+    "Risk Assessment Task": {
+        "overall_risk_rating": "Medium", "risk_summary": "Synthetic.", "risk_categories": {},
+        "key_risk_indicators": [], "mitigation_strategies": [],
+    },
+}
+
+
+class FakeLLM(CachedLLM):
+    """Goes through the same tracing/caching path as `CachedLLM`, minus the provider."""
+
+    def _provider_call(self, messages, tools, callbacks, available_functions):
+        if FAKE_LLM_LATENCY_MS:
+            time.sleep(FAKE_LLM_LATENCY_MS / 1000.0)
+        prompt = messages if isinstance(messages, str) else "\n".join(str(m.get("content", "")) for m in messages)
+        answer = next((a for marker, a in FAKE_ANSWERS.items() if marker in prompt), {"answer": "ok"})
+        return f"Thought: I now know the final answer\nFinal Answer: {json.dumps(answer)}"
+
+
+def build_llm() -> LLM:
+    if LLM_BACKEND == "fake":
+        return FakeLLM(model="fake/" + LLM_MODEL, temperature=LLM_TEMPERATURE, cache_mode="off")
+    return CachedLLM(model=LLM_MODEL, temperature=LLM_TEMPERATURE)
+
+
+## Per-process client
+# Every job's agents share one LLM object and one pooled keep-alive HTTP client, so
+# connections (and TLS sessions) to the provider are reused across jobs and stages.
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def _configure_http_pool():
+    import httpx
+    import litellm
+
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                          max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                          keepalive_expiry=HTTP_KEEPALIVE_SECONDS)
+    timeout = httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=10.0)
+    litellm.client_session = httpx.Client(limits=limits, timeout=timeout)
+
+
+def get_llm() -> LLM:
+    """Returns this process's shared LLM, creating it (and the HTTP pool) on first use."""
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            _configure_http_pool()
+            _llm = build_llm()
+        return _llm
@@ -0,0 +1,134 @@
+## Local LLM response cache and record/replay store
+# Identical prompts (agent retries, repeated documents) are served from an on-disk
+# SQLite store instead of re-paying the provider. The same store backs a record/replay
+# mode so a whole crew run can be captured once and replayed offline, deterministically.
+#
+# LLM_CACHE_MODE:
+#   off     - no caching
+#   cache   - read-through cache (default)
+#   record  - always call the provider and store every response
+#   replay  - only serve stored responses; a miss raises ReplayMissError
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "cache")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_responses.db")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+CACHE_MODES = ("off", "cache", "record", "replay")
+
+
+class ReplayMissError(RuntimeError):
+    """Raised in replay mode when a prompt has no recorded response."""
+
+
+def cache_key(model: str, messages, temperature=None, tools=None, stop=None) -> str:
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "tools": tools, "stop": stop},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteResponseStore:
+    """Size-bounded key -> response store; evicts least-recently-used rows."""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER,"
+                " created_at REAL, last_used_at REAL, hits INTEGER DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_used ON responses (last_used_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets worker processes share the file
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        conn = self._conn()
+        row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        with conn:
+            conn.execute("UPDATE responses SET last_used_at = ?, hits = hits + 1 WHERE key = ?",
+                         (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)", (key, model, response, size, now, now))
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY last_used_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if total <= self.max_bytes * 0.9:  # evict down to 90% to avoid thrashing
+                break
+            doomed.append((key,))
+            total -= size
+        with conn:
+            conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+        self._total_bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SQLiteResponseStore:
+    """Shared per-process store (created lazily so importing this module is cheap)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SQLiteResponseStore()
+        return _store
@@ -1,96 +1,119 @@
 import os
-import json
-from datetime import datetime
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks, Depends
-from crewai import Crew, Process
-from agents import financial_analyst, verifier, investment_advisor, risk_assessor
-from task import analyze_financial_document, investment_analysis, risk_assessment, verification
+import threading
+from typing import List
+from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException, Depends, Header
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
+from pydantic import BaseModel
 import database as db_mod
+import worker
+import events
+import batch as batch_mod
+from uploads import save_upload, check_declared_size
+import telemetry
+import result_store
+import retention
 
 # Load environment variables
 load_dotenv()
 
 app = FastAPI(title="Financial Document Analyzer API", version="2.0.0")
 
+# Tracing exporter is chosen with OTEL_TRACES_EXPORTER (none/console/file/otlp)
+telemetry.setup_tracing("api")
+telemetry.instrument_app(app)
+
 # Ensure directories exist
 os.makedirs("data", exist_ok=True)
 os.makedirs("outputs", exist_ok=True)
 
-def run_crew_logic(task_id: str, query: str, file_path: str, filename: str):
-    """Background task to run the CrewAI agents."""
-    db = next(db_mod.get_db())
-    try:
-        # Initialize Crew
-        financial_crew = Crew(
-            agents=[verifier, financial_analyst, investment_advisor, risk_assessor],
-            tasks=[verification, analyze_financial_document, investment_analysis, risk_assessment],
-            process=Process.sequential,
-        )
-
-        # Kickoff with variable inputs
-        # FIX (Bug #8): Pass file_path so it reaches the agents
-        response = financial_crew.kickoff({
-            'query': query,
-            'file_path': file_path
-        })
-
-        # Save to local file system (Legacy Requirement)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_path = f"outputs/analysis_{timestamp}.json"
-        output_data = {
-            "task_id": task_id,
-            "timestamp": timestamp,
-            "query": query,
-            "file_processed": filename,
-            "analysis": str(response)
-        }
-        with open(output_path, "w") as f:
-            json.dump(output_data, f, indent=2)
-
-        # Update Database (Bonus Feature)
-        db_mod.update_task_result(db, task_id, str(response), output_path, "completed")
-        
-    except Exception as e:
-        print(f"Error in background task: {str(e)}")
-        db_mod.update_task_result(db, task_id, f"Error: {str(e)}", "", "failed")
+# Queue workers embedded in the API process. Set EMBEDDED_WORKERS=0 when running
+# `python worker.py` separately so workers scale independently of uvicorn.
+EMBEDDED_WORKERS = int(os.getenv("EMBEDDED_WORKERS", "1"))
+_embedded_pool = []
+_retention_stop = threading.Event()
+
+MAX_BULK_STATUS = 500
+MAX_PAGE_SIZE = 200
+
+@app.on_event("startup")
+def start_embedded_workers():
+    if EMBEDDED_WORKERS > 0:
+        _embedded_pool.extend(worker.start_pool(EMBEDDED_WORKERS, worker.parse_queues(worker.DEFAULT_QUEUES)))
+
+
+@app.on_event("startup")
+def start_retention():
+    # Evicts old results and uploads by age and total size (RETENTION_INTERVAL_SECONDS=0 disables)
+    retention.start_retention_thread(_retention_stop)
+
+
+@app.on_event("shutdown")
+def stop_embedded_workers():
+    _retention_stop.set()
+    worker.stop_pool(_embedded_pool)
+    _embedded_pool.clear()
 
 @app.get("/")
 def health_check():
-    return {"status": "success", "message": "Financial Document Analyzer API (v2.0) is running with Background Workers and Database Integration"}
+    return {"status": "success", "message": "Financial Document Analyzer API (v2.0) is running with Queue Workers and Database Integration"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics(db: Session = Depends(db_mod.get_db)):
+    """
+    Prometheus-style metrics from the API and all worker processes.
+    """
+    depth = {(("queue", queue),): count for queue, count in db_mod.queue_depth(db).items()}
+    return telemetry.render_metrics({"fda_queue_depth": ("Pending jobs per queue", depth)})
 
 @app.post("/analyze")
 async def analyze_document(
-    background_tasks: BackgroundTasks,
+    request: Request,
     file: UploadFile = File(...),
     query: str = Form(default="Analyze this financial document for investment insights"),
+    priority: int = Form(default=0),
+    force_refresh: bool = Form(default=False),
     db: Session = Depends(db_mod.get_db)
 ):
     """
-    Accepts a PDF, creates a background task, and returns a Task ID.
+    Accepts a PDF, enqueues an analysis job, and returns a Task ID.
     (Bonus: Queue Worker Model implementation)
     """
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
 
-    # Save uploaded file
-    file_path = f"data/{file.filename}"
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    check_declared_size(request.headers.get("content-length"))
+
+    # Stream the upload to content-addressed storage (hash computed while writing)
+    file_path, content_hash, _ = await save_upload(file)
 
-    # Create task in database
-    task_id = db_mod.create_task(db, file.filename, query)
+    # Reuse a stored result (or coalesce onto an in-flight job) for the same document + query
+    if not force_refresh:
+        existing = db_mod.find_reusable_task(db, content_hash, query)
+        if existing:
+            return {
+                "status": existing.status,
+                "message": "Returned stored result" if existing.status == "completed" else "Joined identical in-flight analysis",
+                "task_id": existing.task_id,
+                "file_received": file.filename,
+                "result": result_store.task_result(existing) if existing.status == "completed" else None,
+                "check_status_at": f"/status/{existing.task_id}",
+                "events_at": f"/events/{existing.task_id}"
+            }
 
-    # Add to background worker queue
-    background_tasks.add_task(run_crew_logic, task_id, query, file_path, file.filename)
+    # Create task in database — the row is the durable queue entry picked up by workers
+    task_id = db_mod.create_task(db, file.filename, query, file_path=file_path,
+                                 priority=priority, content_hash=content_hash)
 
     return {
         "status": "pending",
-        "message": "Analysis started in background",
+        "message": "Analysis queued for a background worker",
         "task_id": task_id,
         "file_received": file.filename,
-        "check_status_at": f"/status/{task_id}"
+        "check_status_at": f"/status/{task_id}",
+        "events_at": f"/events/{task_id}"
     }
 
 @app.get("/status/{task_id}")
@@ -102,17 +125,154 @@ def check_status(task_id: str, db: Session = Depends(db_mod.get_db)):
     task = db.query(db_mod.AnalysisResult).filter(db_mod.AnalysisResult.task_id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    return {
+
+    # Stream stored results straight from the compressed blob instead of loading them
+    if task.status == "completed" and task.result_hash and os.path.exists(result_store.blob_path(task.result_hash)):
+        envelope = jsonable_encoder(_task_summary(task, include_result=False))
+        return StreamingResponse(result_store.stream_with_result(envelope, task.result_hash),
+                                 media_type="application/json")
+    return _task_summary(task)
+
+def _task_summary(task, include_result: bool = True) -> dict:
+    summary = {
         "task_id": task.task_id,
         "status": task.status,
         "filename": task.filename,
         "query": task.query,
-        "result": task.result if task.status == "completed" else None,
         "output_file": task.output_path,
         "created_at": task.created_at,
         "completed_at": task.completed_at
     }
+    if include_result:
+        summary["result"] = result_store.task_result(task) if task.status == "completed" else None
+    return summary
+
+class StatusRequest(BaseModel):
+    task_ids: List[str]
+
+@app.post("/status")
+def check_status_bulk(body: StatusRequest, db: Session = Depends(db_mod.get_db)):
+    """
+    Status and results of many tasks in one database query.
+    """
+    if len(body.task_ids) > MAX_BULK_STATUS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_STATUS} task ids per request")
+    found = {task.task_id: task for task in db_mod.get_tasks(db, body.task_ids)}
+    return {
+        "tasks": [_task_summary(found[task_id]) for task_id in body.task_ids if task_id in found],
+        "missing": [task_id for task_id in body.task_ids if task_id not in found],
+    }
+
+@app.get("/tasks")
+def list_tasks(status: str = None, limit: int = 50, cursor: str = None, db: Session = Depends(db_mod.get_db)):
+    """
+    Newest-first job listing, paginated with an opaque keyset `cursor`.
+    """
+    try:
+        tasks, next_cursor = db_mod.list_tasks(db, min(max(limit, 1), MAX_PAGE_SIZE), status, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"tasks": [_task_summary(task, include_result=False) for task in tasks], "next_cursor": next_cursor}
+
+@app.delete("/tasks/{task_id}")
+def cancel_task(task_id: str, db: Session = Depends(db_mod.get_db)):
+    """
+    Cancels a queued or running task. A running crew stops at its next stage boundary
+    or LLM call, and its queue slot is released immediately.
+    """
+    if not db_mod.cancel_task(db, task_id):
+        status = db_mod.get_task_status(db, task_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        raise HTTPException(status_code=409, detail=f"Task already {status}")
+    events.publish(task_id, "cancelled", {"error": "cancelled by request"})
+    return {"task_id": task_id, "status": "cancelled"}
+
+@app.get("/statements/{task_id}")
+def get_statement_items(task_id: str, item: str = None, statement: str = None, db: Session = Depends(db_mod.get_db)):
+    """
+    Returns the typed income statement, balance sheet and cash-flow rows of a task's
+    document, optionally filtered to one line item and/or statement.
+    """
+    task = db.query(db_mod.AnalysisResult).filter(db_mod.AnalysisResult.task_id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not task.file_path or not os.path.exists(task.file_path):
+        raise HTTPException(status_code=410, detail="Document is no longer stored")
+
+    # Arrow is only imported once a client asks for tables, keeping API start-up fast
+    from statements import get_statements, query_statements
+    return {"task_id": task_id, **query_statements(get_statements(task.file_path), item, statement)}
+
+@app.get("/companies/{company}/metrics")
+def compare_company_metrics(company: str, metrics: str = None, start: str = None, end: str = None,
+                            db: Session = Depends(db_mod.get_db)):
+    """
+    Multi-period series of a company's line items and ratios across all analyzed filings.
+    `metrics` is a comma-separated list (default: all); `start`/`end` bound the fiscal years.
+    """
+    wanted = [m.strip() for m in metrics.split(",") if m.strip()] if metrics else None
+    rows = db_mod.get_metric_series(db, company, wanted, start, end)
+    if not rows:
+        raise HTTPException(status_code=404, detail="No metrics on record for this company")
+
+    from history import series_table
+    return {"company": rows[0].entity_name, "entity": rows[0].entity, **series_table(rows)}
+
+@app.post("/batch")
+async def analyze_batch(
+    files: List[UploadFile] = File(...),
+    query: str = Form(default="Analyze this financial document for investment insights"),
+    priority: int = Form(default=0),
+    force_refresh: bool = Form(default=False),
+    db: Session = Depends(db_mod.get_db)
+):
+    """
+    Accepts many PDFs (and/or zip archives of PDFs) with one query. All documents are
+    extracted and indexed in parallel, and one job per document is queued on the
+    `batch` queue. Returns a single batch ID.
+    """
+    documents = await batch_mod.save_batch_files(files)
+    batch_id = batch_mod.enqueue_batch(db, query, documents, priority=priority, force_refresh=force_refresh)
+    return {
+        "status": "pending",
+        "message": f"Batch of {len(documents)} documents queued",
+        "batch_id": batch_id,
+        "documents": [filename for filename, _, _ in documents],
+        "check_status_at": f"/batch/{batch_id}"
+    }
+
+@app.get("/batch/{batch_id}")
+def check_batch_status(batch_id: str, db: Session = Depends(db_mod.get_db)):
+    """
+    Aggregate status of a batch, with each document's result as soon as it completes.
+    """
+    summary = batch_mod.batch_summary(db, batch_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return summary
+
+@app.get("/events/{task_id}")
+async def stream_task_events(
+    task_id: str,
+    last_event_id: int = 0,
+    last_event_id_header: str = Header(default=None, alias="Last-Event-ID"),
+    db: Session = Depends(db_mod.get_db)
+):
+    """
+    Server-Sent Events stream of a task's progress: `started`, `stage_started`,
+    `agent_step`, `stage_completed`, then a final `completed`, `failed`, `cancelled` or
+    `timed_out` event.
+    Reconnecting clients resume after the `Last-Event-ID` header (or `?last_event_id=`).
+    """
+    if not db.query(db_mod.AnalysisResult.id).filter(db_mod.AnalysisResult.task_id == task_id).first():
+        raise HTTPException(status_code=404, detail="Task not found")
+    resume_from = int(last_event_id_header) if last_event_id_header and last_event_id_header.isdigit() else last_event_id
+    return StreamingResponse(
+        events.stream_events(task_id, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,190 @@
+## Deterministic financial statement metric extraction
+# Parses income statement, balance sheet and cash-flow line items out of the extracted
+# report text into per-period NumPy arrays, then computes the ratios `task.py` asks
+# for (margins, D/E, liquidity, ROE/ROA, coverage, YoY deltas) in one vectorized pass,
+# so agents no longer spend LLM iterations on arithmetic.
+import re
+
+import numpy as np
+
+# Canonical line item -> label pattern (matched against the lower-cased row label).
+# The first table row matching a pattern wins.
+LINE_ITEMS = {
+    "revenue": r"(total )?(net )?(revenues?|sales)( net)?",
+    "cost_of_revenue": r"(total )?cost of (revenues?|sales|goods sold)",
+    "gross_profit": r"gross (profit|margin)",
+    "operating_income": r"(total )?(operating income( \(loss\))?|income( \(loss\))? from operations)",
+    "interest_expense": r"interest expense(, net)?",
+    "net_income": r"net (income|earnings)( \(loss\))?( attributable to [a-z .,']+)?",
+    "cash": r"(total )?cash and cash equivalents",
+    "inventory": r"inventor(y|ies)(, net)?",
+    "current_assets": r"total current assets",
+    "total_assets": r"total assets",
+    "current_liabilities": r"total current liabilities",
+    "total_liabilities": r"total liabilities",
+    "short_term_debt": r"(short-term (debt|borrowings)|current portion of long-term debt)",
+    "long_term_debt": r"long-term debt(, net)?( of current portion)?",
+    "equity": r"total (stockholders|shareholders)['’]? equity|total equity",
+    "operating_cash_flow": r"net cash (provided by|from|generated by) (\(used in\) )?operating activities",
+    "capex": r"(purchases? of|payments for|capital expenditures)( property(,)? (plant )?and equipment)?",
+}
+_ITEM_PATTERNS = {item: re.compile(rf"^{pattern}$") for item, pattern in LINE_ITEMS.items()}
+
+# A number cell: optional $, thousands separators, optional decimals, () for negatives,
+# or a dash for zero
+_NUMBER = r"\(?\$?\s*-?\d[\d,]*(?:\.\d+)?\)?%?|[—–-]"
+_ROW = re.compile(rf"^(?P<label>[A-Za-z][A-Za-z ,'’()\-/&.]*?)[\s:$]*(?P<values>(?:(?:{_NUMBER})\s*){{1,6}})$")
+_CELL = re.compile(_NUMBER)
+_YEAR_HEADER = re.compile(r"\b((?:19|20)\d{2})\b")
+_SPACES = re.compile(r"[ \t ]+")
+
+
+def _parse_cell(cell: str) -> float:
+    cell = cell.strip()
+    if cell in ("-", "—", "–"):
+        return 0.0
+    negative = cell.startswith("(") and cell.endswith(")")
+    value = float(re.sub(r"[^\d.\-]", "", cell) or "nan")
+    return -value if negative else value
+
+
+def period_header(line: str) -> list:
+    """Returns the years of a column-header row like "2024 2023", or [] for other lines."""
+    years = _YEAR_HEADER.findall(line)
+    if len(years) >= 2 and len(line) <= 12 * len(years):
+        return years
+    return []
+
+
+def parse_row(line: str):
+    """Returns (label, [values]) for a table row like "Total revenues 1,234 (56)", else None."""
+    match = _ROW.match(line)
+    if not match:
+        return None
+    label = match.group("label").strip(" ,.:")
+    return label, [_parse_cell(c) for c in _CELL.findall(match.group("values"))]
+
+
+def canonical_item(label: str):
+    """Returns the canonical LINE_ITEMS key a row label maps to, or None."""
+    label = label.lower()
+    for item, pattern in _ITEM_PATTERNS.items():
+        if pattern.match(label):
+            return item
+    return None
+
+
+def parse_line_items(text: str) -> dict:
+    """Returns {"periods": [...], "items": {item: np.ndarray}} parsed from report text.
+
+    Columns are kept in document order (most recent period first in SEC filings).
+    """
+    items = {}
+    periods = []
+    for raw in text.split("\n"):
+        line = _SPACES.sub(" ", raw).strip()
+        if not line:
+            continue
+        if not periods:
+            periods = period_header(line)
+            if periods:
+                continue
+        row = parse_row(line)
+        if row is None:
+            continue
+        label, values = row
+        item = canonical_item(label)
+        if item is not None and item not in items:
+            items[item] = np.asarray(values, dtype=np.float64)
+    return {"periods": periods, "items": items}
+
+
+def _aligned(items: dict, width: int) -> dict:
+    """Pads/truncates every item to `width` columns with NaN so ratios vectorize."""
+    out = {}
+    for item in LINE_ITEMS:
+        arr = np.full(width, np.nan)
+        values = items.get(item)
+        if values is not None:
+            n = min(width, values.size)
+            arr[:n] = values[:n]
+        out[item] = arr
+    return out
+
+
+def compute_ratios(parsed: dict) -> dict:
+    """Computes all ratios for every parsed period in a single NumPy pass."""
+    items = parsed["items"]
+    width = max((v.size for v in items.values()), default=0)
+    if width == 0:
+        return {"periods": parsed["periods"], "line_items": {}, "ratios": {}, "yoy_change": {}}
+    x = _aligned(items, width)
+
+    gross_profit = np.where(np.isnan(x["gross_profit"]), x["revenue"] - x["cost_of_revenue"], x["gross_profit"])
+    debt = np.nansum(np.vstack([x["short_term_debt"], x["long_term_debt"]]), axis=0)
+    has_debt = ~(np.isnan(x["short_term_debt"]) & np.isnan(x["long_term_debt"]))
+    debt = np.where(has_debt, debt, x["total_liabilities"])
+    inventory = np.nan_to_num(x["inventory"])
+    fcf = x["operating_cash_flow"] - np.abs(x["capex"])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = {
+            "gross_margin_pct": 100 * gross_profit / x["revenue"],
+            "operating_margin_pct": 100 * x["operating_income"] / x["revenue"],
+            "net_margin_pct": 100 * x["net_income"] / x["revenue"],
+            "debt_to_equity": debt / x["equity"],
+            "current_ratio": x["current_assets"] / x["current_liabilities"],
+            "quick_ratio": (x["current_assets"] - inventory) / x["current_liabilities"],
+            "roe_pct": 100 * x["net_income"] / x["equity"],
+            "roa_pct": 100 * x["net_income"] / x["total_assets"],
+            "interest_coverage": x["operating_income"] / np.abs(x["interest_expense"]),
+            "free_cash_flow": fcf,
+        }
+        # YoY: column 0 vs column 1 for every line item at once
+        stacked = np.vstack([x[item] for item in LINE_ITEMS])
+        if width >= 2:
+            yoy = 100 * (stacked[:, 0] - stacked[:, 1]) / np.abs(stacked[:, 1])
+        else:
+            yoy = np.full(len(LINE_ITEMS), np.nan)
+
+    return {
+        "periods": parsed["periods"][:width],
+        "line_items": {item: _to_list(values) for item, values in items.items()},
+        "ratios": {name: _to_list(values) for name, values in ratios.items()},
+        "yoy_change": {item: _round(v) for item, v in zip(LINE_ITEMS, yoy) if np.isfinite(v)},
+    }
+
+
+def _round(value):
+    return round(float(value), 4) if np.isfinite(value) else None
+
+
+def _to_list(values: np.ndarray) -> list:
+    return [_round(v) for v in values]
+
+
+def analyze_text(text: str) -> dict:
+    return compute_ratios(parse_line_items(text))
+
+
+## Risk flags derived from the latest-period ratios
+RISK_THRESHOLDS = {
+    "current_ratio": ("below", 1.0, "Liquidity: current ratio below 1.0"),
+    "quick_ratio": ("below", 0.8, "Liquidity: quick ratio below 0.8"),
+    "debt_to_equity": ("above", 2.0, "Leverage: debt-to-equity above 2.0"),
+    "interest_coverage": ("below", 1.5, "Credit: interest coverage below 1.5x"),
+    "net_margin_pct": ("below", 0.0, "Profitability: net loss in latest period"),
+    "free_cash_flow": ("below", 0.0, "Cash flow: negative free cash flow"),
+}
+
+
+def risk_flags(ratios: dict) -> list:
+    flags = []
+    for name, (direction, threshold, message) in RISK_THRESHOLDS.items():
+        values = ratios.get(name) or []
+        latest = values[0] if values else None
+        if latest is None:
+            continue
+        if (direction == "below" and latest < threshold) or (direction == "above" and latest > threshold):
+            flags.append({"metric": name, "value": latest, "threshold": threshold, "flag": message})
+    return flags
@@ -0,0 +1,340 @@
+## Crew execution for a single analysis job
+# Moved out of `main.py` so queue workers can run jobs without importing the API app.
+import json
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from crewai import Crew, Process
+from agents import build_agent, financial_analyst, verifier, investment_advisor, risk_assessor
+from task import build_task, analyze_financial_document, investment_analysis, risk_assessment, verification
+import database as db_mod
+from retrieval import get_index
+from statements import get_statements
+from extraction import load_document_text
+from classifier import classify_document, reporting_entity, VERIFICATION_FAST_PATH
+from cache import file_sha256
+import history
+import result_store
+from batch import get_prep_pool, prepare_document
+import events
+from rate_limiter import get_scheduler
+from telemetry import registry, span
+from cancellation import JobStopped, job_control, check_current, current_control, STAGE_TIMEOUT_SECONDS, CANCEL_POLL_SECONDS
+
+
+## Stage DAG
+# stage name -> (agent template, task template, upstream stages). Verification and the
+# core analysis only need the document, so they overlap; investment and risk only need
+# the core analysis, so they run in parallel with each other. Latency is the longest
+# branch, not the sum. Each job builds its own agents and tasks (see `build_crew`).
+STAGES = {
+    "verification": (verifier, verification, ()),
+    "analysis": (financial_analyst, analyze_financial_document, ()),
+    "investment": (investment_advisor, investment_analysis, ("analysis",)),
+    "risk": (risk_assessor, risk_assessment, ("analysis",)),
+}
+
+
+class VerificationFailed(Exception):
+    pass
+
+
+def _parse_output(raw: str):
+    """Returns the stage output as JSON when the agent produced valid JSON."""
+    text = raw.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        return raw
+
+
+def _verification_failed(output) -> bool:
+    if not isinstance(output, dict):
+        return False
+    return (output.get("is_financial_document") is False
+            or str(output.get("verification_status", "")).upper() == "FAILED")
+
+
+def screen_document(task_id: str, file_path: str):
+    """Runs the local verification classifier before any agent is built.
+
+    Returns the verification report when the classifier is confident the document is a
+    financial report, raises VerificationFailed when it is confident it is not, and
+    returns None for ambiguous documents, which go to the LLM verifier.
+    """
+    if not VERIFICATION_FAST_PATH:
+        return None
+    with span("verification.screen", **{"job.id": task_id}) as current:
+        decision, report = classify_document(load_document_text(file_path))
+        current.set_attribute("verification.decision", decision)
+    registry.inc("fda_verification_screen_total", decision=decision)
+    if decision == "ambiguous":
+        return None
+    events.publish(task_id, "stage_completed", {"stage": "verification", "output": report, "source": "local"})
+    if decision == "failed":
+        raise VerificationFailed(json.dumps(report))
+    return report
+
+
+def build_crew(task_id: str, name: str) -> Crew:
+    """Builds a fresh single-stage crew for one job from the stage's templates."""
+    agent_template, task_template, _ = STAGES[name]
+    agent = build_agent(agent_template)
+    return Crew(
+        agents=[agent],
+        tasks=[build_task(task_template, agent)],
+        process=Process.sequential,
+        step_callback=lambda step: events.publish(
+            task_id, "agent_step", {"stage": name, "agent": agent.role, **events.step_summary(step)}),
+    )
+
+
+def _run_stage(task_id: str, name: str, inputs: dict) -> str:
+    crew = build_crew(task_id, name)
+    events.publish(task_id, "stage_started", {"stage": name})
+    started = time.perf_counter()
+    with span("crew.stage", **{"stage": name, "agent": crew.agents[0].role, "job.id": task_id}):
+        output = str(crew.kickoff(inputs))
+    registry.observe("fda_stage_duration_seconds", time.perf_counter() - started, stage=name)
+    return output
+
+
+async def _run_stage_async(task_id: str, name: str, inputs: dict) -> str:
+    crew = build_crew(task_id, name)
+    await asyncio.to_thread(events.publish, task_id, "stage_started", {"stage": name})
+    started = time.perf_counter()
+    with span("crew.stage", **{"stage": name, "agent": crew.agents[0].role, "job.id": task_id}):
+        output = str(await crew.kickoff_async(inputs))
+    registry.observe("fda_stage_duration_seconds", time.perf_counter() - started, stage=name)
+    return output
+
+
+## Stage DAG scheduling, shared by the threaded and asyncio runners
+def _stage_inputs(query: str, file_path: str, prior_periods: str) -> dict:
+    return {
+        'query': query,
+        'file_path': file_path,  # FIX (Bug #8): Pass file_path so it reaches the agents
+        'analysis_context': "",
+        'prior_periods': prior_periods,
+    }
+
+
+def _ready_stages(outputs: dict, running: dict) -> list:
+    """Stages whose upstream stages are done and that are neither done nor running."""
+    return [name for name, (_, _, deps) in STAGES.items()
+            if name not in outputs and name not in running.values() and all(dep in outputs for dep in deps)]
+
+
+def _check_stages(control, running: dict, started: dict):
+    """Raises JobStopped if the job was stopped or a running stage is past STAGE_TIMEOUT_SECONDS."""
+    if control is None:
+        return
+    control.check()
+    for name in running.values():
+        if time.monotonic() - started[name] > STAGE_TIMEOUT_SECONDS:
+            # Also stops the stage thread itself at its next LLM call
+            control.stop("timed_out", f"stage '{name}' exceeded {STAGE_TIMEOUT_SECONDS:g}s")
+            control.check()
+
+
+def _complete_stage(task_id: str, name: str, raw: str, outputs: dict, inputs: dict):
+    outputs[name] = _parse_output(raw)
+    events.publish(task_id, "stage_completed", {"stage": name, "output": outputs[name]})
+    if name == "analysis":
+        inputs["analysis_context"] = raw
+    if name == "verification" and _verification_failed(outputs[name]):
+        raise VerificationFailed(json.dumps(outputs[name]))
+
+
+def run_stages(task_id: str, query: str, file_path: str, verification_output: dict = None,
+               prior_periods: str = history.NO_HISTORY) -> dict:
+    """Runs the stage DAG and returns {stage name: output}.
+
+    Raises VerificationFailed (cancelling stages that have not started) if the
+    verifier rejects the document, and JobStopped if the job is cancelled, passes its
+    deadline, or a stage runs longer than STAGE_TIMEOUT_SECONDS. When
+    `verification_output` is given (the local classifier already verified the document)
+    the LLM verification stage is skipped. `prior_periods` carries the entity's earlier
+    recorded periods into the analysis.
+    """
+    inputs = _stage_inputs(query, file_path, prior_periods)
+    outputs = {"verification": verification_output} if verification_output is not None else {}
+    control = current_control.get()
+    running = {}
+    started = {}
+    pool = ThreadPoolExecutor(max_workers=len(STAGES))
+    try:
+        while len(outputs) < len(STAGES):
+            for name in _ready_stages(outputs, running):
+                # Copy the context so LLM calls in the stage thread are attributed to this job
+                ctx = contextvars.copy_context()
+                running[pool.submit(ctx.run, _run_stage, task_id, name, dict(inputs))] = name
+                started[name] = time.monotonic()
+
+            # Wake up regularly to notice cancellation and deadlines while stages run
+            done, _ = wait(running, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            _check_stages(control, running, started)
+            for future in done:
+                _complete_stage(task_id, running.pop(future), future.result(), outputs, inputs)
+    finally:
+        # Don't block the job on stages made irrelevant by a failure or a stop; unstarted
+        # ones are dropped, and running ones stop at their next LLM call
+        pool.shutdown(wait=False, cancel_futures=True)
+    return outputs
+
+
+async def run_stages_async(task_id: str, query: str, file_path: str, verification_output: dict = None,
+                           prior_periods: str = history.NO_HISTORY) -> dict:
+    """Asyncio variant of `run_stages` with the same DAG, deadlines and errors.
+
+    Stages are tasks on the running event loop rather than threads owned by the job.
+    """
+    inputs = _stage_inputs(query, file_path, prior_periods)
+    outputs = {"verification": verification_output} if verification_output is not None else {}
+    control = current_control.get()
+    running = {}
+    started = {}
+    try:
+        while len(outputs) < len(STAGES):
+            for name in _ready_stages(outputs, running):
+                # Tasks copy the current context, so the job's attribution and control follow
+                running[asyncio.ensure_future(_run_stage_async(task_id, name, dict(inputs)))] = name
+                started[name] = time.monotonic()
+
+            done, _ = await asyncio.wait(running, timeout=CANCEL_POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            await asyncio.to_thread(_check_stages, control, running, started)
+            for future in done:
+                await asyncio.to_thread(_complete_stage, task_id, running.pop(future), future.result(), outputs, inputs)
+    finally:
+        for future in running:
+            future.cancel()
+    return outputs
+
+
+def _company_name(stage_outputs: dict) -> str:
+    analysis = stage_outputs.get("analysis")
+    company = analysis.get("company", "") if isinstance(analysis, dict) else ""
+    return "" if str(company).strip().upper() in ("", "N/A", "UNKNOWN") else str(company)
+
+
+## Job lifecycle, shared by the threaded and asyncio runners
+# Each step uses its own short database session, so a job does not hold a pooled
+# connection while its crew waits on the LLM.
+def _prepare_job(task_id: str, file_path: str) -> dict:
+    """Screens the document and loads what every stage needs; returns the job context."""
+    # Reject clearly invalid documents (and accept clearly valid ones) locally,
+    # before any agent setup or LLM spend
+    verification_output = screen_document(task_id, file_path)
+
+    # Build (or load) the document's chunk index and statement tables once, before
+    # any agent queries them
+    get_index(file_path)
+    get_statements(file_path)
+
+    # Earlier periods of the same company, recorded by previous analyses
+    text = load_document_text(file_path)
+    content_hash = file_sha256(file_path)
+    entity = reporting_entity(text)
+    with db_mod.session_scope() as db:
+        prior_periods = history.prior_periods_context(db, entity, text, content_hash)
+    check_current()
+    return {"verification_output": verification_output, "prior_periods": prior_periods,
+            "text": text, "content_hash": content_hash, "entity": entity}
+
+
+def _finish_job(task_id: str, job: dict, stage_outputs: dict) -> str:
+    """Records a finished crew's result; returns the job's final status."""
+    check_current()
+    with db_mod.session_scope() as db:
+        # Store the result once, compressed and keyed by its content hash; the job row
+        # only references it (replaces the timestamped outputs/analysis_*.json files)
+        result_hash, output_path, result_bytes = result_store.put_result(stage_outputs)
+
+        # Update Database (Bonus Feature). Not recorded if the job was cancelled or timed
+        # out meanwhile; whoever stopped it has already announced that.
+        if not db_mod.update_task_result(db, task_id, None, output_path, "completed", result_hash, result_bytes):
+            return db_mod.get_task_status(db, task_id)
+
+        # Keep this filing's metrics for later jobs and the comparison endpoint. Best
+        # effort: the analysis itself has already been stored.
+        try:
+            history.record_analysis(db, job["entity"] or _company_name(stage_outputs), job["text"],
+                                    task_id, job["content_hash"])
+        except Exception as e:
+            db.rollback()
+            print(f"Could not record metric history for {task_id}: {e}")
+        events.publish(task_id, "completed", {"result": stage_outputs, "output_file": output_path})
+        return "completed"
+
+
+def _record_failure(task_id: str, error: Exception) -> str:
+    """Records why a job ended early; returns the job's final status."""
+    with db_mod.session_scope() as db:
+        if isinstance(error, JobStopped):
+            if db_mod.update_task_result(db, task_id, f"Error: {error.reason}", "", error.status):
+                events.publish(task_id, error.status, {"error": error.reason})
+            return error.status
+        if isinstance(error, VerificationFailed):
+            if db_mod.update_task_result(db, task_id, f"Error: document failed verification: {error}", "", "failed"):
+                events.publish(task_id, "failed", {"error": "document failed verification",
+                                                   "verification": json.loads(str(error))})
+            return "failed"
+        print(f"Error in background task: {str(error)}")
+        if db_mod.update_task_result(db, task_id, f"Error: {str(error)}", "", "failed"):
+            events.publish(task_id, "failed", {"error": str(error)})
+        return "failed"
+
+
+def run_crew_logic(task_id: str, query: str, file_path: str, filename: str):
+    """Runs the CrewAI agents for one job and records the result.
+
+    The job stops early (between stages or LLM calls) when it is cancelled or runs past
+    JOB_TIMEOUT_SECONDS, and ends as `cancelled` or `timed_out`.
+    """
+    started = time.perf_counter()
+    status = "failed"
+    with job_control(task_id):
+        try:
+            events.publish(task_id, "started", {"filename": filename, "query": query})
+            job = _prepare_job(task_id, file_path)
+
+            # Run the stage DAG and merge per-stage outputs into one result
+            with get_scheduler().job(task_id):
+                stage_outputs = run_stages(task_id, query, file_path, job["verification_output"], job["prior_periods"])
+            status = _finish_job(task_id, job, stage_outputs)
+        except Exception as e:
+            status = _record_failure(task_id, e)
+        finally:
+            registry.inc("fda_jobs_total", status=status)
+            registry.observe("fda_job_duration_seconds", time.perf_counter() - started, status=status)
+
+
+async def run_crew_logic_async(task_id: str, query: str, file_path: str, filename: str):
+    """Asyncio variant of `run_crew_logic` for the event-loop worker (`worker.py --mode async`).
+
+    Parsing runs in the preparation process pool and blocking database work in the
+    loop's executor, so one event loop can drive hundreds of jobs at once.
+    """
+    started = time.perf_counter()
+    status = "failed"
+    with job_control(task_id):
+        try:
+            await asyncio.to_thread(events.publish, task_id, "started", {"filename": filename, "query": query})
+            # Extract and index in the process pool (keeping pypdf off the loop's GIL);
+            # `_prepare_job` then reads the text from the extraction cache
+            await asyncio.get_running_loop().run_in_executor(get_prep_pool(), prepare_document, file_path)
+            job = await asyncio.to_thread(_prepare_job, task_id, file_path)
+
+            with get_scheduler().job(task_id):
+                stage_outputs = await run_stages_async(task_id, query, file_path, job["verification_output"],
+                                                       job["prior_periods"])
+            status = await asyncio.to_thread(_finish_job, task_id, job, stage_outputs)
+        except Exception as e:
+            status = await asyncio.to_thread(_record_failure, task_id, e)
+        finally:
+            registry.inc("fda_jobs_total", status=status)
+            registry.observe("fda_job_duration_seconds", time.perf_counter() - started, status=status)
@@ -0,0 +1,229 @@
+## Global LLM request/token budget scheduler
+# Every LLM call from every job, agent and worker process draws from one pair of
+# token buckets (requests/minute and tokens/minute) sized to the provider quota. The
+# buckets live in a shared SQLite file so all worker processes see the same budget.
+#
+# Fairness: callers register a waiting ticket tagged with their job id; when budget is
+# available it is granted to the waiting job that has been served the fewest calls,
+# so one large job cannot starve the others. 429s trigger a shared cooldown and shrink
+# the effective rate (AIMD); successes slowly restore it. Waiters sleep until the budget
+# can cover them instead of polling the shared file on a fixed short interval.
+import os
+import time
+import uuid
+import random
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager
+from dotenv import load_dotenv
+load_dotenv()
+
+from cancellation import check_current
+
+LLM_RPM = float(os.getenv("LLM_RPM", "500"))
+LLM_TPM = float(os.getenv("LLM_TPM", "200000"))
+BUDGET_DB_PATH = os.getenv("LLM_BUDGET_PATH", "cache/llm_budget.db")
+COMPLETION_TOKEN_RESERVE = int(os.getenv("LLM_COMPLETION_TOKEN_RESERVE", "1000"))
+MAX_RATE_LIMIT_RETRIES = int(os.getenv("LLM_MAX_RATE_LIMIT_RETRIES", "5"))
+
+MIN_RATE_FACTOR = 0.1
+WAITER_STALE_SECONDS = 30.0
+# A head of line that has not polled for this long is presumed dead and skipped; live
+# waiters poll at least every _WAITER_MAX_SLEEP, and a skipped live waiter rejoins in place
+HEAD_STALE_SECONDS = float(os.getenv("LLM_BUDGET_HEAD_STALE_SECONDS", "5"))
+_MIN_SLEEP = 0.02
+_HEAD_MAX_SLEEP = 1.0
+_WAITER_MAX_SLEEP = 2.0
+
+# Set by the pipeline for the duration of a job so every LLM call is attributed to it
+current_job = contextvars.ContextVar("current_job", default="anonymous")
+
+
+def estimate_tokens(messages) -> int:
+    """Rough token count (~4 characters per token) for budgeting purposes."""
+    if isinstance(messages, str):
+        return len(messages) // 4 + 1
+    return sum(len(str(m.get("content", ""))) for m in messages) // 4 + 1
+
+
+def _jittered(seconds: float, limit: float) -> float:
+    """Spreads out polls of waiters that computed the same wait (e.g. after a shared cooldown)."""
+    return min(max(seconds, _MIN_SLEEP) * random.uniform(1.0, 1.25), limit)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return (type(error).__name__ == "RateLimitError"
+            or getattr(error, "status_code", None) == 429
+            or "429" in str(error)[:200])
+
+
+class BudgetScheduler:
+    def __init__(self, path: str = BUDGET_DB_PATH, rpm: float = LLM_RPM, tpm: float = LLM_TPM):
+        self.path = path
+        self.rpm = rpm
+        self.tpm = tpm
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS budget ("
+                " id INTEGER PRIMARY KEY CHECK (id = 1), requests REAL, tokens REAL,"
+                " updated_at REAL, rate_factor REAL, cooldown_until REAL, consecutive_429 INTEGER)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS waiters ("
+                " ticket TEXT PRIMARY KEY, job_id TEXT, enqueued_at REAL, heartbeat REAL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS job_usage (job_id TEXT PRIMARY KEY, served INTEGER, last_seen REAL)")
+            conn.execute(
+                "INSERT OR IGNORE INTO budget VALUES (1, ?, ?, ?, 1.0, 0, 0)",
+                (self.rpm, self.tpm, time.time()),
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _refill(self, conn, now: float):
+        requests, tokens, updated_at, factor, cooldown_until = conn.execute(
+            "SELECT requests, tokens, updated_at, rate_factor, cooldown_until FROM budget WHERE id = 1"
+        ).fetchone()
+        elapsed = max(0.0, now - updated_at)
+        requests = min(self.rpm, requests + elapsed * self.rpm * factor / 60.0)
+        tokens = min(self.tpm, tokens + elapsed * self.tpm * factor / 60.0)
+        return requests, tokens, factor, cooldown_until
+
+    def acquire(self, est_tokens: int, job_id: str = None):
+        """Blocks until this job's turn and one request + `est_tokens` of budget are available."""
+        job_id = job_id or current_job.get()
+        est_tokens = min(est_tokens, self.tpm)
+        ticket = uuid.uuid4().hex
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("INSERT INTO waiters VALUES (?, ?, ?, ?)", (ticket, job_id, now, now))
+            # A newly arriving job starts level with the least-served waiting job (virtual
+            # time), so it neither starves older jobs nor waits behind their history
+            conn.execute(
+                "INSERT OR IGNORE INTO job_usage SELECT ?, COALESCE(MIN(served), 0), ? FROM job_usage"
+                " WHERE job_id IN (SELECT job_id FROM waiters WHERE job_id != ?)",
+                (job_id, now, job_id),
+            )
+        try:
+            while True:
+                wait = self._try_acquire(conn, ticket, job_id, now, est_tokens)
+                if wait is None:
+                    return
+                # A job cancelled or timed out while queued for budget gives up its turn
+                check_current()
+                time.sleep(wait)
+        finally:
+            with conn:
+                conn.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+
+    def _try_acquire(self, conn, ticket: str, job_id: str, enqueued_at: float, est_tokens: int):
+        """One scheduling attempt; returns None when granted, else seconds to sleep.
+
+        The head of the line sleeps until its budget deficit is refilled (cooldowns
+        included). The others poll about once per grant interval: the line is reordered
+        by calls served, so any of them may be next after the following grant.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            # Re-inserted in place if a slow poll got this ticket skipped as a stale head
+            conn.execute("INSERT OR REPLACE INTO waiters VALUES (?, ?, ?, ?)", (ticket, job_id, enqueued_at, now))
+            conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - WAITER_STALE_SECONDS,))
+            # Line order: oldest ticket of the least-served waiting job first (a job whose
+            # usage row was forgotten mid-wait counts as unserved)
+            line = conn.execute(
+                "SELECT w.ticket, w.heartbeat FROM waiters w LEFT JOIN job_usage u ON u.job_id = w.job_id"
+                " ORDER BY COALESCE(u.served, 0), w.enqueued_at"
+            ).fetchall()
+            while line and line[0][0] != ticket and line[0][1] < now - HEAD_STALE_SECONDS:
+                conn.execute("DELETE FROM waiters WHERE ticket = ?", (line.pop(0)[0],))
+            position = [t for t, _ in line].index(ticket)
+
+            requests, tokens, factor, cooldown_until = self._refill(conn, now)
+            rate = factor / 60.0
+            if position:
+                conn.execute("COMMIT")
+                per_grant = max(1 / (self.rpm * rate), est_tokens / (self.tpm * rate))
+                return _jittered(max(cooldown_until - now, 0.0) + per_grant, _WAITER_MAX_SLEEP)
+            if now < cooldown_until:
+                conn.execute("COMMIT")
+                return _jittered(cooldown_until - now, _HEAD_MAX_SLEEP)
+            if requests < 1 or tokens < est_tokens:
+                conn.execute("COMMIT")
+                deficit = max((1 - requests) / (self.rpm * rate), (est_tokens - tokens) / (self.tpm * rate))
+                return _jittered(deficit, _HEAD_MAX_SLEEP)
+
+            conn.execute(
+                "UPDATE budget SET requests = ?, tokens = ?, updated_at = ? WHERE id = 1",
+                (requests - 1, tokens - est_tokens, now),
+            )
+            conn.execute("UPDATE job_usage SET served = served + 1, last_seen = ? WHERE job_id = ?", (now, job_id))
+            conn.execute("COMMIT")
+            return None
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def settle(self, reserved_tokens: int, actual_tokens: int):
+        """Charges (or refunds) the difference between reserved and actual token use."""
+        delta = actual_tokens - reserved_tokens
+        if delta:
+            with self._conn() as conn:
+                conn.execute("UPDATE budget SET tokens = tokens - ? WHERE id = 1", (delta,))
+
+    def record_success(self):
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE budget SET consecutive_429 = 0, rate_factor = MIN(1.0, rate_factor + 0.02) WHERE id = 1"
+            )
+
+    def record_rate_limited(self) -> float:
+        """Applies multiplicative decrease and a shared exponential cooldown; returns the backoff."""
+        conn = self._conn()
+        with conn:
+            count, = conn.execute("SELECT consecutive_429 FROM budget WHERE id = 1").fetchone()
+            backoff = min(60.0, 2.0 ** count)
+            conn.execute(
+                "UPDATE budget SET consecutive_429 = consecutive_429 + 1,"
+                " rate_factor = MAX(?, rate_factor * 0.7), cooldown_until = MAX(cooldown_until, ?) WHERE id = 1",
+                (MIN_RATE_FACTOR, time.time() + backoff),
+            )
+        return backoff
+
+    def forget_job(self, job_id: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM job_usage WHERE job_id = ?", (job_id,))
+
+    @contextmanager
+    def job(self, job_id: str):
+        """Attributes LLM calls made inside the block to `job_id`."""
+        token = current_job.set(job_id)
+        try:
+            yield
+        finally:
+            current_job.reset(token)
+            self.forget_job(job_id)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> BudgetScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = BudgetScheduler()
+        return _scheduler
@@ -0,0 +1,69 @@
+## Compressed, content-addressed result store
+# Replaces `outputs/analysis_{timestamp}.json` (second-resolution names, so concurrent
+# completions overwrote each other) and the uncompressed `AnalysisResult.result` text.
+# Each result is stored once as compact gzip-compressed JSON under its SHA-256; the job
+# row keeps only the hash, and identical results share one blob. Reads are streamed in
+# chunks so `/status` never holds a whole result in memory.
+import os
+import gzip
+import json
+import codecs
+import hashlib
+import threading
+
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", "outputs/results")
+COMPRESS_LEVEL = 6
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def blob_path(digest: str) -> str:
+    return os.path.join(RESULT_STORE_DIR, digest[:2], f"{digest}.json.gz")
+
+
+def put_result(result) -> tuple:
+    """Stores `result` as compact JSON; returns (sha256, blob path, uncompressed bytes)."""
+    payload = json.dumps(result, separators=(",", ":"), default=str).encode("utf-8")
+    digest = hashlib.sha256(payload).hexdigest()
+    path = blob_path(digest)
+    if os.path.exists(path):
+        os.utime(path)  # a new reference keeps the blob young for retention
+        return digest, path, len(payload)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=COMPRESS_LEVEL, mtime=0) as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return digest, path, len(payload)
+
+
+def iter_result_text(digest: str):
+    """Yields the stored JSON text in chunks (UTF-8 decoded incrementally)."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with gzip.open(blob_path(digest), "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def task_result(task):
+    """Returns a job's result text: from the store, or the legacy inline column."""
+    if task.result_hash:
+        try:
+            return "".join(iter_result_text(task.result_hash))
+        except FileNotFoundError:
+            return None  # evicted by the retention policy
+    return task.result
+
+
+def stream_with_result(envelope: dict, digest: str):
+    """Streams `envelope` as a JSON object with the stored result appended as its
+    `"result"` string, escaping chunk by chunk instead of loading the blob."""
+    yield json.dumps(envelope, default=str)[:-1] + ', "result": "'
+    for text in iter_result_text(digest):
+        yield json.dumps(text)[1:-1]
+    yield '"}'
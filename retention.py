@@ -0,0 +1,126 @@
+## Retention policy for stored results and uploads
+# Evicts result blobs (and legacy `outputs/analysis_*.json` files) and uploaded PDFs
+# (with their index/statement sidecars) by age and by total size, oldest first, and
+# prunes old progress events. Runs as a background thread in the API process, or once:
+#
+#     python retention.py
+#
+# Uploads still referenced by queued or running jobs are never evicted. A blob that
+# was re-referenced while the sweep ran (its mtime moved) is kept.
+import os
+import re
+import glob
+import time
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+load_dotenv()
+
+import database as db_mod
+import result_store
+from uploads import UPLOAD_DIR
+
+RESULT_RETENTION_DAYS = float(os.getenv("RESULT_RETENTION_DAYS", "30"))
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_MB", "1024")) * 1024 * 1024
+DATA_RETENTION_DAYS = float(os.getenv("DATA_RETENTION_DAYS", "7"))
+DATA_MAX_BYTES = int(os.getenv("DATA_MAX_MB", "10240")) * 1024 * 1024
+EVENT_RETENTION_DAYS = float(os.getenv("EVENT_RETENTION_DAYS", "7"))
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+
+LEGACY_OUTPUT_PATTERN = os.path.join("outputs", "analysis_*.json")
+_UPLOAD_NAME = re.compile(r"^[0-9a-f]{64}\.pdf$")
+
+
+def _stat_files(paths) -> list:
+    """Returns [(mtime, size, path)] oldest first, skipping files removed meanwhile."""
+    entries = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    return entries
+
+
+def _select_evictions(entries: list, max_age_days: float, max_bytes: int) -> list:
+    """Everything older than the age limit, then the oldest files until under the size limit."""
+    cutoff = time.time() - max_age_days * 86400
+    total = sum(size for _, size, _ in entries)
+    evict = []
+    for mtime, size, path in entries:
+        if mtime < cutoff or total > max_bytes:
+            evict.append((mtime, size, path))
+            total -= size
+    return evict
+
+
+def _remove_if_unchanged(path: str, mtime: float) -> bool:
+    try:
+        if os.stat(path).st_mtime != mtime:
+            return False
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def evict_results(db) -> dict:
+    blobs = glob.glob(os.path.join(result_store.RESULT_STORE_DIR, "*", "*.json.gz"))
+    entries = _stat_files(blobs + glob.glob(LEGACY_OUTPUT_PATTERN))
+    digests, freed = [], 0
+    for mtime, size, path in _select_evictions(entries, RESULT_RETENTION_DAYS, RESULT_STORE_MAX_BYTES):
+        if _remove_if_unchanged(path, mtime):
+            freed += size
+            if path.endswith(".json.gz"):
+                digests.append(os.path.basename(path)[:-len(".json.gz")])
+    db_mod.forget_results(db, digests)
+    return {"files": len(digests), "bytes": freed}
+
+
+def evict_uploads(db) -> dict:
+    active = {os.path.abspath(path) for path in db_mod.active_file_paths(db)}
+    # Only content-addressed uploads (`<sha256>.pdf`), never PDFs placed in data/ by hand
+    uploads = [path for path in glob.glob(os.path.join(UPLOAD_DIR, "*.pdf"))
+               if _UPLOAD_NAME.match(os.path.basename(path))]
+    entries = [entry for entry in _stat_files(uploads) if os.path.abspath(entry[2]) not in active]
+    removed, freed = 0, 0
+    for mtime, size, path in _select_evictions(entries, DATA_RETENTION_DAYS, DATA_MAX_BYTES):
+        if not _remove_if_unchanged(path, mtime):
+            continue
+        removed += 1
+        freed += size
+        for sidecar in glob.glob(glob.escape(path) + ".*"):
+            freed += os.path.getsize(sidecar)
+            os.remove(sidecar)
+    return {"files": removed, "bytes": freed}
+
+
+def enforce_retention() -> dict:
+    """Runs one sweep and returns what was evicted."""
+    with db_mod.session_scope() as db:
+        report = {"results": evict_results(db), "uploads": evict_uploads(db)}
+        report["events"] = db_mod.prune_job_events(db, datetime.utcnow() - timedelta(days=EVENT_RETENTION_DAYS))
+    return report
+
+
+def start_retention_thread(stop: threading.Event):
+    """Sweeps every RETENTION_INTERVAL_SECONDS until `stop` is set (0 disables)."""
+    if RETENTION_INTERVAL_SECONDS <= 0:
+        return None
+
+    def loop():
+        while not stop.wait(RETENTION_INTERVAL_SECONDS):
+            try:
+                enforce_retention()
+            except Exception as e:
+                print(f"Retention sweep failed: {e}")
+
+    thread = threading.Thread(target=loop, name="retention", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    print(enforce_retention())
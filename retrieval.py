@@ -0,0 +1,188 @@
+## Per-document BM25 chunk index
+# Instead of pushing the whole report into every agent's context, each document is
+# split into page/section chunks once and indexed with BM25. Agents then pull only
+# the top-k chunks for a sub-query ("balance sheet", "liquidity", ...). The index is
+# fully local (NumPy postings, no network) and is persisted next to the PDF in
+# `data/` so later jobs on the same file reuse it.
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from cache import file_sha256
+from extraction import iter_pages
+from telemetry import span
+
+INDEX_VERSION = "1"
+CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1500"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this "
+    "to was were which with".split()
+)
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _chunk_page(content: str):
+    """Splits a page into ~CHUNK_CHARS chunks on line boundaries so tables stay intact."""
+    buf, size = [], 0
+    for line in content.split("\n"):
+        if size + len(line) > CHUNK_CHARS and buf:
+            yield "\n".join(buf)
+            buf, size = [], 0
+        buf.append(line)
+        size += len(line) + 1
+    if buf and any(line.strip() for line in buf):
+        yield "\n".join(buf)
+
+
+class DocumentIndex:
+    """BM25 index over the chunks of one document, stored as flat NumPy postings.
+
+    Postings are kept in CSR layout: the chunk ids and term frequencies for term `t`
+    live at `post_chunks[post_offsets[t]:post_offsets[t + 1]]`.
+    """
+
+    def __init__(self, digest, chunks, pages, vocab, post_offsets, post_chunks, post_tf, chunk_lengths):
+        self.digest = digest
+        self.chunks = chunks
+        self.pages = pages
+        self.vocab = vocab
+        self.post_offsets = post_offsets
+        self.post_chunks = post_chunks
+        self.post_tf = post_tf
+        self.chunk_lengths = chunk_lengths
+        n = len(chunks)
+        df = np.diff(post_offsets).astype(np.float64)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        self.avg_length = float(chunk_lengths.mean()) if n else 0.0
+
+    @classmethod
+    def build(cls, path: str, digest: str = None) -> "DocumentIndex":
+        return cls.from_pages(iter_pages(path), digest or file_sha256(path))
+
+    @classmethod
+    def from_pages(cls, page_texts, digest: str) -> "DocumentIndex":
+        """Builds the index from an iterable of normalized page texts."""
+        chunks, pages = [], []
+        for page_no, content in enumerate(page_texts, start=1):
+            for chunk in _chunk_page(content):
+                chunks.append(chunk)
+                pages.append(page_no)
+
+        vocab = {}
+        postings = []  # per term: list of (chunk_id, tf)
+        lengths = np.zeros(len(chunks), dtype=np.int32)
+        for chunk_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            lengths[chunk_id] = sum(counts.values())
+            for term, tf in counts.items():
+                term_id = vocab.setdefault(term, len(vocab))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((chunk_id, tf))
+
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings])
+        flat = [entry for plist in postings for entry in plist]
+        post_chunks = np.fromiter((c for c, _ in flat), dtype=np.int32, count=len(flat))
+        post_tf = np.fromiter((tf for _, tf in flat), dtype=np.float32, count=len(flat))
+        return cls(digest, chunks, np.asarray(pages, dtype=np.int32), vocab,
+                   offsets, post_chunks, post_tf, lengths)
+
+    def search(self, query: str, top_k: int = 5) -> list:
+        """Returns up to `top_k` (score, page, chunk_text) tuples, best first."""
+        scores = np.zeros(len(self.chunks), dtype=np.float64)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.chunk_lengths / (self.avg_length or 1.0))
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            lo, hi = self.post_offsets[term_id], self.post_offsets[term_id + 1]
+            ids = self.post_chunks[lo:hi]
+            tf = self.post_tf[lo:hi]
+            scores[ids] += self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + norm[ids])
+
+        hits = np.flatnonzero(scores)
+        if hits.size == 0:
+            return []
+        k = min(top_k, hits.size)
+        best = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), int(self.pages[i]), self.chunks[i]) for i in best]
+
+    def save(self, index_path: str):
+        terms = np.empty(len(self.vocab), dtype=object)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+        tmp_path = f"{index_path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            version=np.array(INDEX_VERSION),
+            digest=np.array(self.digest),
+            chunks=np.array(self.chunks, dtype=object),
+            pages=self.pages,
+            terms=terms,
+            post_offsets=self.post_offsets,
+            post_chunks=self.post_chunks,
+            post_tf=self.post_tf,
+            chunk_lengths=self.chunk_lengths,
+        )
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, index_path: str, digest: str):
+        """Loads a persisted index, or returns None if it is missing or stale."""
+        try:
+            data = np.load(index_path, allow_pickle=True)
+        except (OSError, ValueError):
+            return None
+        with data:
+            if str(data["version"]) != INDEX_VERSION or str(data["digest"]) != digest:
+                return None
+            vocab = {term: i for i, term in enumerate(data["terms"].tolist())}
+            return cls(digest, data["chunks"].tolist(), data["pages"], vocab,
+                       data["post_offsets"], data["post_chunks"], data["post_tf"],
+                       data["chunk_lengths"])
+
+
+def index_path_for(path: str) -> str:
+    return f"{path}.index.npz"
+
+
+_indexes = OrderedDict()  # digest -> DocumentIndex, small per-process LRU
+_indexes_lock = threading.Lock()
+_MAX_LOADED_INDEXES = 16
+
+
+def get_index(path: str) -> DocumentIndex:
+    """Returns the index for `path`, loading it from disk or building it once."""
+    digest = file_sha256(path)
+    with _indexes_lock:
+        index = _indexes.get(digest)
+        if index is not None:
+            _indexes.move_to_end(digest)
+            return index
+
+    index_path = index_path_for(path)
+    with span("index.load", **{"document.sha256": digest}) as current:
+        index = DocumentIndex.load(index_path, digest)
+        current.set_attribute("index.built", index is None)
+        if index is None:
+            index = DocumentIndex.build(path, digest)
+            index.save(index_path)
+        current.set_attribute("index.chunks", len(index.chunks))
+
+    with _indexes_lock:
+        _indexes[digest] = index
+        while len(_indexes) > _MAX_LOADED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
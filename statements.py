@@ -0,0 +1,150 @@
+## Columnar financial-statement table store
+# Income statement, balance sheet and cash-flow tables are extracted once per document
+# into a typed Arrow table (one row per line item, period and value) and persisted as
+# Parquet next to the PDF in `data/`. Later jobs, the `/statements` endpoint and the
+# Statement Line Item tool memory-map the file instead of re-reading the document, so
+# fetching one line item across periods is a column filter, not an LLM re-parse.
+import os
+import threading
+from collections import OrderedDict
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from cache import file_sha256
+from classifier import SECTION_HEADINGS, CORE_SECTIONS
+from metrics import LINE_ITEMS, period_header, parse_row, canonical_item
+
+TABLE_VERSION = "1"
+# Statement headings are short title lines, not sentences that mention a statement
+MAX_HEADING_CHARS = 120
+
+SCHEMA = pa.schema([
+    ("statement", pa.dictionary(pa.int8(), pa.string())),
+    ("line_item", pa.string()),
+    ("item", pa.string()),  # canonical `metrics.LINE_ITEMS` key, null if unrecognized
+    ("period", pa.string()),
+    ("column", pa.int8()),
+    ("value", pa.float64()),
+    ("page", pa.int32()),
+])
+
+
+def extract_statements(page_texts, digest: str) -> pa.Table:
+    """Builds the statement table from an iterable of page texts (page 1 first).
+
+    Rows are only taken inside a statement, i.e. after a statement heading and before
+    the next non-core heading, so numbers quoted in narrative sections are ignored.
+    """
+    columns = {name: [] for name in SCHEMA.names}
+    statement, periods = None, []
+    for page_no, content in enumerate(page_texts, start=1):
+        for raw in content.split("\n"):
+            line = " ".join(raw.split())
+            if not line:
+                continue
+            if len(line) <= MAX_HEADING_CHARS:
+                heading = next((name for name, pattern in SECTION_HEADINGS.items() if pattern.search(line)), None)
+                if heading is not None:
+                    statement = heading if heading in CORE_SECTIONS else None
+                    periods = []
+                    continue
+            if statement is None:
+                continue
+            header = period_header(line)
+            if header:
+                periods = header
+                continue
+            row = parse_row(line)
+            if row is None:
+                continue
+            label, values = row
+            item = canonical_item(label)
+            for column, value in enumerate(values):
+                columns["statement"].append(statement)
+                columns["line_item"].append(label)
+                columns["item"].append(item)
+                columns["period"].append(periods[column] if column < len(periods) else f"col{column + 1}")
+                columns["column"].append(column)
+                columns["value"].append(value)
+                columns["page"].append(page_no)
+
+    metadata = {"version": TABLE_VERSION, "digest": digest}
+    return pa.Table.from_pydict(columns, schema=SCHEMA.with_metadata(metadata))
+
+
+def table_path_for(path: str) -> str:
+    return f"{path}.statements.parquet"
+
+
+def save_statements(table: pa.Table, table_path: str):
+    tmp_path = f"{table_path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, table_path)
+
+
+def load_statements(table_path: str, digest: str):
+    """Memory-maps a persisted table, or returns None if it is missing or stale."""
+    try:
+        metadata = pq.read_schema(table_path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    if metadata.get(b"version") != TABLE_VERSION.encode() or metadata.get(b"digest") != digest.encode():
+        return None
+    return pq.read_table(table_path, memory_map=True)
+
+
+_tables = OrderedDict()  # digest -> pa.Table, small per-process LRU
+_tables_lock = threading.Lock()
+_MAX_LOADED_TABLES = 32
+
+
+def get_statements(path: str) -> pa.Table:
+    """Returns the statement table for `path`, loading it from disk or extracting it once."""
+    digest = file_sha256(path)
+    with _tables_lock:
+        table = _tables.get(digest)
+        if table is not None:
+            _tables.move_to_end(digest)
+            return table
+
+    table_path = table_path_for(path)
+    table = load_statements(table_path, digest)
+    if table is None:
+        # Page texts come from the chunk index, which is built (or loaded) anyway
+        from retrieval import get_index
+        index = get_index(path)
+        pages = {}
+        for page, chunk in zip(index.pages.tolist(), index.chunks):
+            pages.setdefault(page, []).append(chunk)
+        page_texts = ("\n".join(pages.get(page, [])) for page in range(1, max(pages, default=0) + 1))
+        table = extract_statements(page_texts, digest)
+        save_statements(table, table_path)
+
+    with _tables_lock:
+        _tables[digest] = table
+        while len(_tables) > _MAX_LOADED_TABLES:
+            _tables.popitem(last=False)
+    return table
+
+
+def query_statements(table: pa.Table, item: str = None, statement: str = None) -> dict:
+    """Filters the table to one line item and/or statement.
+
+    `item` is either a canonical item key (e.g. "revenue") or, case-insensitively, a
+    substring of the row label as printed in the document.
+    """
+    mask = None
+    if item in LINE_ITEMS:
+        mask = pc.fill_null(pc.equal(table["item"], item), False)
+    elif item:
+        mask = pc.match_substring(table["line_item"], item, ignore_case=True)
+    if statement:
+        by_statement = pc.equal(pc.cast(table["statement"], pa.string()), statement)
+        mask = by_statement if mask is None else pc.and_(mask, by_statement)
+    rows = table.filter(mask) if mask is not None else table
+    return {
+        "periods": sorted(set(rows["period"].to_pylist()), reverse=True),
+        "rows": rows.to_pylist(),
+    }
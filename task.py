@@ -1,21 +1,43 @@
 ## Importing libraries and files
+import copy
+
 from crewai import Task
 
-from agents import financial_analyst, verifier, investment_advisor, risk_assessor
-from tools import read_data_tool
+from agents import freeze_template, financial_analyst, verifier, investment_advisor, risk_assessor
+from tools import (
+    read_data_tool, search_document_tool, statement_lookup_tool,
+    financial_metrics_tool, investment_metrics_tool, risk_metrics_tool,
+)
 
 # PROMPT IMPROVEMENT: Rewrote all task descriptions and expected_outputs from
 # intentionally vague/broken prompts to structured, JSON-output, professional definitions.
 # Also fixed Bug (TK4): `verification` task was incorrectly assigned to `financial_analyst`
 # instead of the `verifier` agent.
+#
+# Tasks run as a DAG (see `pipeline.STAGES`), not one sequential crew: verification and
+# core analysis run concurrently, then investment and risk run in parallel with the
+# core analysis passed in through the `{analysis_context}` input.
+#
+# Like the agents, these are immutable templates; `build_task` creates a fresh Task
+# bound to a job's own agent instance.
+
+
+def build_task(template, agent) -> Task:
+    fields = dict(template)
+    fields["agent"] = agent
+    fields["tools"] = [copy.copy(t) for t in template["tools"]]
+    return Task(**fields)
+
 
 ## Task 1: Document Verification
-verification = Task(
+verification = freeze_template(
     description=(
         "## Document Verification Task\n\n"
         "**File to verify:** {file_path}\n\n"
         "### Instructions:\n"
-        "1. Read the financial document at the provided file path using the available tool.\n"
+        "1. Use the Financial Document Search tool on the provided file path to look up each "
+        "section below (e.g. \"income statement\", \"balance sheet\", \"cash flows\"). "
+        "Only read the full document if the search results are insufficient.\n"
         "2. Confirm that the document is a legitimate financial report (e.g., 10-K, 10-Q, "
         "annual report, earnings release, or audited financial statement).\n"
         "3. Check for the presence of standard financial sections:\n"
@@ -42,20 +64,28 @@ verification = Task(
         "}"
     ),
     agent=verifier,  # FIX (TK4): Was incorrectly assigned to `financial_analyst` instead of `verifier`
-    tools=[read_data_tool],
+    tools=[search_document_tool, read_data_tool],
     async_execution=False,
 )
 
 
 ## Task 2: Core Financial Analysis
-analyze_financial_document = Task(
+analyze_financial_document = freeze_template(
     description=(
         "## Financial Document Analysis Task\n\n"
         "**Document path:** {file_path}\n"
         "**User query:** {query}\n\n"
+        "### Prior periods on record for this company (from earlier filings):\n"
+        "{prior_periods}\n\n"
         "### Instructions:\n"
-        "1. Read the full financial document at {file_path} using the available tool.\n"
-        "2. Extract and analyze the following key financial metrics:\n"
+        "1. Use the Financial Document Search tool on {file_path} to retrieve the sections "
+        "you need (e.g. \"income statement\", \"balance sheet\", \"cash flows\", "
+        "\"earnings per share\"). Only read the full document if the search results are insufficient.\n"
+        "2. Call the Financial Ratio Calculator on {file_path} first — it returns the ratios below "
+        "computed directly from the statements. Use its values as-is; only derive a metric "
+        "yourself if it is null. To get any single line item across periods, use the "
+        "Statement Line Item Lookup tool on {file_path} rather than re-reading the statements. "
+        "Key financial metrics:\n"
         "   - Revenue and revenue growth (YoY %)\n"
         "   - Gross profit margin and net profit margin\n"
         "   - Earnings Per Share (EPS) — basic and diluted\n"
@@ -63,7 +93,8 @@ analyze_financial_document = Task(
         "   - Total debt, debt-to-equity ratio\n"
         "   - Current ratio and quick ratio (liquidity)\n"
         "   - Return on Equity (ROE) and Return on Assets (ROA)\n"
-        "3. Identify key trends, year-over-year changes, and material financial events.\n"
+        "3. Identify key trends, year-over-year changes, and material financial events. "
+        "Where prior periods are on record, extend the trends across them.\n"
         "4. Address the specific user query: {query}\n"
         "5. Note any significant risks, opportunities, or anomalies found in the data.\n\n"
         "### Important:\n"
@@ -94,21 +125,25 @@ analyze_financial_document = Task(
         "}"
     ),
     agent=financial_analyst,
-    tools=[read_data_tool],
+    tools=[financial_metrics_tool, statement_lookup_tool, search_document_tool, read_data_tool],
     async_execution=False,
 )
 
 
 ## Task 3: Investment Analysis
-investment_analysis = Task(
+investment_analysis = freeze_template(
     description=(
         "## Investment Analysis Task\n\n"
         "**Document path:** {file_path}\n"
         "**User query:** {query}\n\n"
+        "### Core financial analysis (already performed):\n"
+        "{analysis_context}\n\n"
         "### Instructions:\n"
         "1. Using the financial analysis already performed, assess the investment profile "
         "of the company.\n"
-        "2. Calculate or estimate standard valuation metrics where data is available:\n"
+        "2. Call the Investment Metrics Calculator on {file_path} for margins, returns, free cash "
+        "flow and YoY growth instead of computing them. "
+        "Calculate or estimate standard valuation metrics where data is available:\n"
         "   - Price-to-Earnings (P/E) ratio\n"
         "   - Price-to-Book (P/B) ratio\n"
         "   - Enterprise Value / EBITDA (EV/EBITDA)\n"
@@ -141,27 +176,33 @@ investment_analysis = Task(
         "}"
     ),
     agent=investment_advisor,
-    tools=[read_data_tool],
+    tools=[investment_metrics_tool, financial_metrics_tool, statement_lookup_tool, search_document_tool, read_data_tool],
     async_execution=False,
 )
 
 
 ## Task 4: Risk Assessment
-risk_assessment = Task(
+risk_assessment = freeze_template(
     description=(
         "## Risk Assessment Task\n\n"
         "**Document path:** {file_path}\n"
         "**User query:** {query}\n\n"
+        "### Core financial analysis (already performed):\n"
+        "{analysis_context}\n\n"
         "### Instructions:\n"
-        "1. Read and analyze the financial document at {file_path} for risk indicators.\n"
+        "1. Use the Financial Document Search tool on {file_path} to retrieve risk-relevant "
+        "sections (e.g. \"risk factors\", \"liquidity\", \"debt\", \"legal proceedings\") "
+        "rather than reading the full document.\n"
         "2. Assess the following risk categories based on documented evidence:\n"
         "   - **Market Risk**: Exposure to macroeconomic factors, FX, interest rate sensitivity\n"
         "   - **Credit Risk**: Debt levels, credit ratings (if mentioned), interest coverage ratio\n"
         "   - **Liquidity Risk**: Current ratio, quick ratio, cash runway\n"
         "   - **Operational Risk**: Supply chain issues, regulatory challenges, cost pressures\n"
         "   - **Regulatory/Compliance Risk**: Legal proceedings, SEC notices, pending litigation\n"
-        "3. Assign a risk rating (Low / Medium / High) to each category with justification.\n"
-        "4. Provide risk mitigation strategies appropriate to the company's financial profile.\n\n"
+        "3. Call the Risk Metrics Calculator on {file_path} for debt-to-equity, current/quick ratio, "
+        "interest coverage and threshold flags instead of computing them by hand.\n"
+        "4. Assign a risk rating (Low / Medium / High) to each category with justification.\n"
+        "5. Provide risk mitigation strategies appropriate to the company's financial profile.\n\n"
         "### Important:\n"
         "Base all risk assessments strictly on data found in the document. "
         "Provide balanced, proportionate assessments — neither overstating nor understating risk."
@@ -183,6 +224,6 @@ risk_assessment = Task(
         "}"
     ),
     agent=risk_assessor,
-    tools=[read_data_tool],
+    tools=[risk_metrics_tool, statement_lookup_tool, search_document_tool, read_data_tool],
     async_execution=False,
 )
\ No newline at end of file
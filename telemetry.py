@@ -0,0 +1,272 @@
+## Tracing and metrics
+# Spans cover the upload write, queue wait, PDF extraction, each crew stage and each
+# LLM call. The exporter is chosen with OTEL_TRACES_EXPORTER:
+#   none (default) | console | file (JSON lines at OTEL_TRACES_FILE) | otlp
+#
+# Metrics are kept in a small Prometheus-style registry. Workers run in separate
+# processes, so every process periodically snapshots its registry to METRICS_DIR and
+# the API merges all snapshots when `/metrics` is scraped (the same approach as the
+# Prometheus client's multiprocess mode). A process removes its snapshot when it exits,
+# and snapshots of processes that died without doing so are dropped at the next merge.
+import os
+import json
+import time
+import atexit
+import threading
+import multiprocessing.util
+from contextlib import contextmanager
+from dotenv import load_dotenv
+load_dotenv()
+
+from opentelemetry import trace
+
+OTEL_TRACES_EXPORTER = os.getenv("OTEL_TRACES_EXPORTER", "none")
+OTEL_TRACES_FILE = os.getenv("OTEL_TRACES_FILE", "outputs/traces.jsonl")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "financial-document-analyzer")
+METRICS_DIR = os.getenv("METRICS_DIR", "cache/metrics")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+tracer = trace.get_tracer("financial-document-analyzer")
+
+_tracing_configured = False
+_tracing_lock = threading.Lock()
+
+
+def setup_tracing(role: str = "api"):
+    """Installs the configured span exporter once per process."""
+    global _tracing_configured
+    with _tracing_lock:
+        if _tracing_configured or OTEL_TRACES_EXPORTER == "none":
+            return
+        _tracing_configured = True
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if OTEL_TRACES_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    elif OTEL_TRACES_EXPORTER == "file":
+        exporter = _JsonLinesSpanExporter(OTEL_TRACES_FILE)
+    elif OTEL_TRACES_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    else:
+        raise ValueError(f"Unknown OTEL_TRACES_EXPORTER '{OTEL_TRACES_EXPORTER}'")
+
+    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME, "service.role": role}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    atexit.register(provider.shutdown)
+
+
+def instrument_app(app):
+    """Adds per-request server spans when the FastAPI instrumentation is installed."""
+    if OTEL_TRACES_EXPORTER == "none":
+        return
+    try:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    except ImportError:
+        return  # instrumentation package not installed, skip gracefully
+    FastAPIInstrumentor.instrument_app(app, excluded_urls="metrics")
+
+
+class _JsonLinesSpanExporter:
+    """Appends one JSON object per finished span to a local file."""
+
+    def __init__(self, path: str):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+        self._success = SpanExportResult.SUCCESS
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def export(self, spans):
+        lines = "".join(json.dumps(json.loads(span.to_json())) + "\n" for span in spans)
+        with self._lock, open(self.path, "a") as f:
+            f.write(lines)
+        return self._success
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000):
+        return True
+
+
+## Prometheus-style metrics registry
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+METRICS = {
+    # name: (type, help, buckets)
+    "fda_jobs_total": ("counter", "Finished analysis jobs by final status", None),
+    "fda_job_duration_seconds": ("histogram", "Wall-clock time to run one analysis job", DEFAULT_BUCKETS),
+    "fda_queue_wait_seconds": ("histogram", "Time a job waited in the queue before a worker claimed it", DEFAULT_BUCKETS),
+    "fda_stage_duration_seconds": ("histogram", "Wall-clock time of one crew stage", DEFAULT_BUCKETS),
+    "fda_llm_request_duration_seconds": ("histogram", "LLM call latency, including cache lookups", DEFAULT_BUCKETS),
+    "fda_llm_requests_total": ("counter", "LLM calls by cache result", None),
+    "fda_llm_tokens_total": ("counter", "Estimated LLM tokens by direction", None),
+    "fda_extraction_pages_total": ("counter", "PDF pages extracted", None),
+    "fda_extraction_seconds_total": ("counter", "Time spent extracting PDF text", None),
+    "fda_extraction_pages_per_second": ("histogram", "Extraction throughput per document",
+                                        (10, 25, 50, 100, 250, 500, 1000, 2500)),
+    "fda_extraction_cache_total": ("counter", "Extraction cache lookups by result", None),
+    "fda_verification_screen_total": ("counter", "Local verification classifier decisions", None),
+    "fda_upload_bytes_total": ("counter", "Bytes received through uploads", None),
+}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}  # (name, labels) -> float, or [bucket counts..., sum, count] for histograms
+        self._last_flush = 0.0
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+        self._maybe_flush()
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+        self._maybe_flush()
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[name, list(labels), value if isinstance(value, float) else list(value)]
+                    for (name, labels), value in self._values.items()]
+
+    def _maybe_flush(self):
+        now = time.time()
+        if now - self._last_flush >= METRICS_FLUSH_SECONDS:
+            self._last_flush = now
+            self.flush()
+
+    def flush(self):
+        """Writes this process's snapshot so other processes' `/metrics` can include it."""
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            path = _snapshot_path(os.getpid())
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            pass
+
+
+    def discard(self):
+        """Removes this process's snapshot when it exits; its values leave the totals."""
+        try:
+            os.remove(_snapshot_path(os.getpid()))
+        except OSError:
+            pass
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = MetricsRegistry()
+atexit.register(registry.discard)
+# Worker-pool processes exit through multiprocessing, which skips atexit
+multiprocessing.util.Finalize(None, registry.discard, exitpriority=0)
+
+
+def _merged_values() -> dict:
+    merged = {}
+    sources = [registry.snapshot()]
+    own_file = f"{os.getpid()}.json"
+    if os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if not name.endswith(".json") or name == own_file:
+                continue
+            pid = name[:-len(".json")]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                # Left behind by a process that was killed before it could remove it
+                try:
+                    os.remove(os.path.join(METRICS_DIR, name))
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(os.path.join(METRICS_DIR, name)) as f:
+                    sources.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    for snapshot in sources:
+        for name, labels, value in snapshot:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            if isinstance(value, list):
+                current = merged.setdefault(key, [0] * len(value))
+                merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = merged.get(key, 0.0) + value
+    return merged
+
+
+def _labels(pairs, extra=()) -> str:
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_metrics(gauges: dict = None) -> str:
+    """Prometheus text exposition of all processes' metrics plus scrape-time gauges.
+
+    `gauges` maps metric name -> (help, {labels tuple: value}).
+    """
+    merged = _merged_values()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = [(labels, value) for (n, labels), value in merged.items() if n == name]
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(series):
+            if kind == "histogram":
+                for bound, count in zip(buckets, value):
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {value[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+            else:
+                lines.append(f"{name}{_labels(labels)} {value}")
+    for name, (help_text, series) in (gauges or {}).items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in series.items():
+            lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Starts a span with the given attributes (None values are skipped)."""
+    with tracer.start_as_current_span(name) as current:
+        for key, value in attributes.items():
+            if value is not None:
+                current.set_attribute(key, value)
+        yield current
@@ -1,10 +1,15 @@
 ## Importing libraries and files
 import os
+import json
 from dotenv import load_dotenv
 load_dotenv()
 
 from crewai.tools import tool  # FIX (Bug #4): `from crewai_tools import tools` caused ImportError
-from langchain_community.document_loaders import PyPDFLoader  # FIX (Bug #5): `Pdf` was used but never imported
+
+from extraction import load_document_text  # FIX (Bug #5): replaces the never-imported `Pdf` loader
+from retrieval import get_index
+from metrics import analyze_text, risk_flags
+from statements import get_statements, query_statements
 
 ## Creating search tool (optional — requires SERPER_API_KEY)
 try:
@@ -15,7 +20,8 @@ except ImportError:
 
 ## FIX (Bug #5 + Bug #6):
 # Bug #5: `Pdf` was never imported — caused NameError when reading any PDF.
-#         Fixed by importing and using `PyPDFLoader` from langchain_community.
+#         Fixed by importing and using `PyPDFLoader` from langchain_community,
+#         since replaced by the streaming engine in `extraction.py`.
 # Bug #6: Tool was `async` (CrewAI cannot await it, returns coroutine not data)
 #         and had no `@tool` decorator (agent couldn't recognize or call it).
 #         Fixed by making it a sync function with proper `@tool` decorator + docstring.
@@ -30,48 +36,133 @@ def read_data_tool(path: str = 'data/sample.pdf') -> str:
     Returns:
         str: Full text content extracted from the financial document.
     """
-    loader = PyPDFLoader(file_path=path)
-    docs = loader.load()
+    return load_document_text(path)
+
 
-    full_report = ""
-    for data in docs:
-        # Clean and format the financial document data
-        content = data.page_content
+@tool("Financial Document Search")
+def search_document_tool(path: str, query: str, top_k: int = 5) -> str:
+    """Searches a financial PDF and returns only the sections most relevant to a query.
 
-        # Remove extra whitespaces and format properly
-        while "\n\n" in content:
-            content = content.replace("\n\n", "\n")
+    Prefer this over reading the full document: ask for the specific section or topic
+    you need, e.g. "balance sheet", "liquidity", "interest expense" or "risk factors".
 
-        full_report += content + "\n"
+    Args:
+        path (str): Path to the PDF file to search.
+        query (str): Short sub-query describing the section or topic needed.
+        top_k (int): Number of sections to return. Defaults to 5.
 
-    return full_report
+    Returns:
+        str: The best-matching sections, each labelled with its page number.
+    """
+    results = get_index(path).search(query, top_k=top_k)
+    if not results:
+        return f"No sections matching '{query}' were found in {path}."
+    return "\n\n".join(
+        f"[Page {page} | score {score:.2f}]\n{chunk}" for score, page, chunk in results
+    )
 
 
 ## Creating a wrapper class to maintain backward compatibility with agents.py import
 class FinancialDocumentTool:
     read_data_tool = read_data_tool
+    search_document_tool = search_document_tool
 
 
 ## Creating Investment Analysis Tool
-class InvestmentTool:
-    def analyze_investment_tool(self, financial_document_data):
-        # Process and analyze the financial document data
-        processed_data = financial_document_data
+# Ratios are computed deterministically by `metrics.py` so agents do not spend
+# LLM iterations on arithmetic.
+INVESTMENT_RATIOS = (
+    "gross_margin_pct", "operating_margin_pct", "net_margin_pct",
+    "roe_pct", "roa_pct", "free_cash_flow",
+)
+RISK_RATIOS = ("debt_to_equity", "current_ratio", "quick_ratio", "interest_coverage")
 
-        # Clean up the data format
-        i = 0
-        while i < len(processed_data):
-            if processed_data[i:i+2] == "  ":  # Remove double spaces
-                processed_data = processed_data[:i] + processed_data[i+1:]
-            else:
-                i += 1
 
-        # TODO: Implement investment analysis logic here
-        return "Investment analysis functionality to be implemented"
+class InvestmentTool:
+    def analyze_investment_tool(self, financial_document_data):
+        # PERF: Parsing splits on whitespace runs in one regex pass; the old
+        # character-by-character double-space loop was O(n²).
+        analysis = analyze_text(financial_document_data)
+        return {
+            "periods": analysis["periods"],
+            "ratios": {name: analysis["ratios"].get(name) for name in INVESTMENT_RATIOS},
+            "yoy_change": analysis["yoy_change"],
+            "line_items": analysis["line_items"],
+        }
 
 
 ## Creating Risk Assessment Tool
 class RiskTool:
     def create_risk_assessment_tool(self, financial_document_data):
-        # TODO: Implement risk assessment logic here
-        return "Risk assessment functionality to be implemented"
\ No newline at end of file
+        analysis = analyze_text(financial_document_data)
+        ratios = {name: analysis["ratios"].get(name) for name in RISK_RATIOS}
+        return {
+            "periods": analysis["periods"],
+            "ratios": ratios,
+            "risk_flags": risk_flags(analysis["ratios"]),
+        }
+
+
+@tool("Statement Line Item Lookup")
+def statement_lookup_tool(path: str, item: str, statement: str = "") -> str:
+    """Returns one financial-statement line item across all reported periods.
+
+    Reads the document's pre-extracted statement tables instead of the full text. Use a
+    canonical item name (revenue, cost_of_revenue, gross_profit, operating_income,
+    interest_expense, net_income, cash, inventory, current_assets, total_assets,
+    current_liabilities, total_liabilities, short_term_debt, long_term_debt, equity,
+    operating_cash_flow, capex) or any words from the row label, e.g. "research".
+
+    Args:
+        path (str): Path to the PDF file.
+        item (str): Canonical item name or part of the row label.
+        statement (str): Optional "Income Statement", "Balance Sheet" or "Cash Flow".
+
+    Returns:
+        str: JSON object with the matching periods and rows (statement, line item, period, value, page).
+    """
+    return json.dumps(query_statements(get_statements(path), item, statement or None))
+
+
+@tool("Financial Ratio Calculator")
+def financial_metrics_tool(path: str) -> str:
+    """Computes key financial ratios for a financial PDF without any manual arithmetic.
+
+    Parses the income statement, balance sheet and cash flow statement and returns
+    per-period margins, debt-to-equity, current and quick ratios, ROE/ROA, interest
+    coverage, free cash flow and year-over-year changes. Values that cannot be found
+    in the document are null.
+
+    Args:
+        path (str): Path to the PDF file to analyze.
+
+    Returns:
+        str: JSON object with periods, line_items, ratios and yoy_change.
+    """
+    return json.dumps(analyze_text(load_document_text(path)))
+
+
+@tool("Investment Metrics Calculator")
+def investment_metrics_tool(path: str) -> str:
+    """Computes profitability, return and growth metrics for a financial PDF.
+
+    Args:
+        path (str): Path to the PDF file to analyze.
+
+    Returns:
+        str: JSON object with margins, ROE/ROA, free cash flow and YoY changes per period.
+    """
+    return json.dumps(InvestmentTool().analyze_investment_tool(load_document_text(path)))
+
+
+@tool("Risk Metrics Calculator")
+def risk_metrics_tool(path: str) -> str:
+    """Computes leverage, liquidity and coverage ratios and flags breached risk thresholds.
+
+    Args:
+        path (str): Path to the PDF file to analyze.
+
+    Returns:
+        str: JSON object with debt-to-equity, current/quick ratio, interest coverage and risk flags.
+    """
+    return json.dumps(RiskTool().create_risk_assessment_tool(load_document_text(path)))
@@ -0,0 +1,90 @@
+## Streaming, content-addressed upload storage
+# Uploads are copied to disk in fixed-size chunks (never held whole in memory),
+# hashed while streaming, and stored as `data/<sha256>.pdf`. Identical uploads share
+# one file, and two uploads with the same filename can no longer overwrite each other.
+import os
+import uuid
+import hashlib
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+
+from cache import remember_digest
+from telemetry import registry, span
+
+UPLOAD_DIR = "data"
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024
+
+
+def check_declared_size(content_length):
+    """Rejects a request up front when its Content-Length already exceeds the limit."""
+    if not content_length:
+        return
+    try:
+        declared = int(content_length)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    if declared > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+
+
+async def save_upload(file: UploadFile) -> tuple:
+    """Streams `file` to content-addressed storage and returns (path, sha256, size)."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    tmp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    with span("upload.write", **{"upload.filename": file.filename}) as current:
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                while True:
+                    chunk = await file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > MAX_UPLOAD_BYTES:
+                        raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+                    digest.update(chunk)
+                    await out.write(chunk)
+
+            current.set_attribute("upload.bytes", size)
+            registry.inc("fda_upload_bytes_total", size)
+            return _store(tmp_path, digest.hexdigest()) + (size,)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def save_stream(stream) -> tuple:
+    """Blocking variant of `save_upload` for file-like objects (e.g. zip members)."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    tmp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+                digest.update(chunk)
+                out.write(chunk)
+        return _store(tmp_path, digest.hexdigest()) + (size,)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _store(tmp_path: str, content_hash: str) -> tuple:
+    """Moves a fully written temp file to its content-addressed path."""
+    file_path = os.path.join(UPLOAD_DIR, f"{content_hash}.pdf")
+    if os.path.exists(file_path):
+        os.remove(tmp_path)
+        os.utime(file_path)  # a repeat upload keeps the stored file young for retention
+    else:
+        os.replace(tmp_path, file_path)
+    remember_digest(file_path, content_hash)
+    return file_path, content_hash
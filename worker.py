@@ -0,0 +1,288 @@
+## Queue worker pool
+# Runs analysis jobs from the durable SQLite queue in `database.py`, independently of
+# the API process. Start it alongside uvicorn:
+#
+#     python worker.py --processes 4 --queues default=4,batch=2
+#
+# In the default thread mode each process claims one job at a time under a renewable
+# lease. In async mode (`--mode async --concurrency 200 --queues default=200`) each
+# process runs up to `--concurrency` jobs at once on one event loop. If a worker dies,
+# its lease expires and the job is claimed again by another worker. A reaper thread in
+# the parent process returns such orphaned jobs to the queue and times out jobs that
+# run past their deadline, so stuck workers cannot hold queue capacity forever.
+import os
+import sys
+import time
+import atexit
+import signal
+import socket
+import asyncio
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import SQLAlchemyError
+from dotenv import load_dotenv
+load_dotenv()
+
+import database as db_mod
+import events
+from telemetry import registry, setup_tracing, span, tracer
+
+POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1.0"))
+DEFAULT_QUEUES = os.getenv("WORKER_QUEUES", "default=4,batch=2")
+REAPER_INTERVAL = float(os.getenv("REAPER_INTERVAL_SECONDS", "30"))
+# "thread" (one job per process at a time) or "async" (many jobs per process on one event loop)
+WORKER_MODE = os.getenv("WORKER_MODE", "thread")
+ASYNC_CONCURRENCY = int(os.getenv("WORKER_ASYNC_CONCURRENCY", "200"))
+# Upper bound of the exponential back-off after a failed claim (database down or locked)
+DB_RETRY_MAX_SECONDS = float(os.getenv("WORKER_DB_RETRY_MAX_SECONDS", "30"))
+
+_reaper_stop = threading.Event()
+
+
+def parse_queues(spec: str) -> dict:
+    """Parses "default=4,batch=2" into {"default": 4, "batch": 2} (limit defaults to 1)."""
+    queues = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, limit = part.partition("=")
+        queues[name.strip()] = int(limit) if limit else 1
+    return queues
+
+
+def _db_backoff(failures: int) -> float:
+    return min(POLL_INTERVAL * 2 ** failures, DB_RETRY_MAX_SECONDS)
+
+
+def _keep_lease(task_id: str, worker_id: str, stop: threading.Event):
+    with db_mod.session_scope() as db:
+        while not stop.wait(db_mod.LEASE_SECONDS / 3):
+            try:
+                if not db_mod.renew_lease(db, task_id, worker_id):
+                    return
+            except SQLAlchemyError as e:
+                # Retried at the next heartbeat; the lease outlives two missed renewals
+                db.rollback()
+                print(f"Lease renewal for {task_id} failed: {e}")
+
+
+def _record_queue_wait(job):
+    """Records the time between enqueue and claim as a span ending now."""
+    waited = max(0.0, (datetime.utcnow() - job.created_at).total_seconds())
+    queue_span = tracer.start_span("queue.wait", start_time=time.time_ns() - int(waited * 1e9),
+                                   attributes={"job.queue": job.queue, "job.attempt": job.attempts})
+    queue_span.end()
+    registry.observe("fda_queue_wait_seconds", waited, queue=job.queue)
+
+
+def worker_loop(worker_id: str, queues: dict, stop: threading.Event = None):
+    setup_tracing("worker")
+
+    stop = stop or threading.Event()
+    db = db_mod.SessionLocal()
+    failures = 0
+    try:
+        while not stop.is_set():
+            try:
+                job = db_mod.claim_next_task(db, worker_id, queues)
+                failures = 0
+            except SQLAlchemyError as e:
+                db.rollback()
+                print(f"Worker {worker_id} could not claim a job: {e}")
+                stop.wait(_db_backoff(failures))
+                failures += 1
+                continue
+            if job is None:
+                stop.wait(POLL_INTERVAL)
+                continue
+
+            # Import lazily so the crew stack is only loaded once a worker has a job
+            from pipeline import run_crew_logic
+
+            lease_stop = threading.Event()
+            heartbeat = threading.Thread(target=_keep_lease, args=(job.task_id, worker_id, lease_stop), daemon=True)
+            heartbeat.start()
+            try:
+                with span("job", **{"job.id": job.task_id, "job.queue": job.queue, "worker.id": worker_id}):
+                    _record_queue_wait(job)
+                    run_crew_logic(job.task_id, job.query, job.file_path, job.filename)
+                failures = 0
+            except Exception as e:
+                # Usually the database failing while the job's outcome was recorded; the
+                # job's lease lapses and the reaper requeues it, and this worker carries on
+                db.rollback()
+                print(f"Worker {worker_id} failed to run {job.task_id}: {e}")
+                stop.wait(_db_backoff(failures))
+                failures += 1
+            finally:
+                lease_stop.set()
+                heartbeat.join()
+    finally:
+        db.close()
+
+
+## Asyncio worker
+# Claiming, lease renewal, the stage DAG, deadlines and events for every job run on one
+# event loop; blocking database calls go to the loop's executor and PDF parsing to the
+# preparation process pool. CrewAI's agent loop is synchronous, so each running stage
+# parks one executor thread while it waits on the LLM.
+def _claim(worker_id: str, queues: dict):
+    with db_mod.session_scope() as db:
+        return db_mod.claim_next_task(db, worker_id, queues)
+
+
+def _renew_leases(task_ids: list, worker_id: str):
+    with db_mod.session_scope() as db:
+        db_mod.renew_leases(db, task_ids, worker_id)
+
+
+async def _keep_leases(active: dict, worker_id: str):
+    """One heartbeat for all of this process's jobs."""
+    while True:
+        await asyncio.sleep(db_mod.LEASE_SECONDS / 3)
+        if active:
+            try:
+                await asyncio.to_thread(_renew_leases, list(active), worker_id)
+            except SQLAlchemyError as e:
+                print(f"Lease renewal for worker {worker_id} failed: {e}")
+
+
+async def _run_job_async(job, worker_id: str):
+    from pipeline import run_crew_logic_async
+
+    try:
+        with span("job", **{"job.id": job.task_id, "job.queue": job.queue, "worker.id": worker_id}):
+            _record_queue_wait(job)
+            await run_crew_logic_async(job.task_id, job.query, job.file_path, job.filename)
+    except Exception as e:
+        # As in `worker_loop`: the lease lapses, the reaper requeues the job
+        print(f"Worker {worker_id} failed to run {job.task_id}: {e}")
+
+
+async def async_worker_loop(worker_id: str, queues: dict, concurrency: int = ASYNC_CONCURRENCY,
+                            stop: asyncio.Event = None):
+    setup_tracing("worker")
+
+    loop = asyncio.get_running_loop()
+    # Up to two stages per job run concurrently, each holding one thread inside CrewAI
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency * 2 + 16))
+    stop = stop or asyncio.Event()
+    active = {}  # task_id -> asyncio.Task
+    heartbeat = asyncio.create_task(_keep_leases(active, worker_id))
+    failures = 0
+    try:
+        while not stop.is_set():
+            try:
+                job = await asyncio.to_thread(_claim, worker_id, queues) if len(active) < concurrency else None
+                failures = 0
+            except SQLAlchemyError as e:
+                print(f"Worker {worker_id} could not claim a job: {e}")
+                await asyncio.sleep(_db_backoff(failures))
+                failures += 1
+                continue
+            if job is None:
+                if active:
+                    await asyncio.wait(list(active.values()), timeout=POLL_INTERVAL,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    await asyncio.sleep(POLL_INTERVAL)
+                continue
+
+            task = asyncio.create_task(_run_job_async(job, worker_id))
+            active[job.task_id] = task
+            task.add_done_callback(lambda _, task_id=job.task_id: active.pop(task_id, None))
+    finally:
+        heartbeat.cancel()
+        if active:
+            await asyncio.gather(*active.values(), return_exceptions=True)
+
+
+def reap_jobs() -> int:
+    """Requeues orphaned jobs and times out overdue ones; returns how many were touched."""
+    with db_mod.session_scope() as db:
+        recovered = db_mod.requeue_orphaned_tasks(db)
+        expired = db_mod.expire_overdue_tasks(db)
+    for task_id in expired:
+        events.publish(task_id, "timed_out", {"error": "job exceeded its deadline"})
+    return recovered + len(expired)
+
+
+def _reaper_loop(stop: threading.Event):
+    while not stop.wait(REAPER_INTERVAL):
+        try:
+            reap_jobs()
+        except Exception as e:
+            print(f"Job reaper failed: {e}")
+
+
+def _process_main(index: int, queues: dict, mode: str, concurrency: int):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    # `stop_pool` sends SIGTERM; exit normally so this worker's own process pools are shut down
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        if mode == "async":
+            asyncio.run(async_worker_loop(worker_id, queues, concurrency))
+        else:
+            worker_loop(worker_id, queues)
+    except KeyboardInterrupt:
+        pass
+
+
+def start_pool(processes: int, queues: dict, mode: str = WORKER_MODE, concurrency: int = ASYNC_CONCURRENCY) -> list:
+    """Re-claims orphaned jobs, then starts `processes` worker processes and the reaper."""
+    recovered = reap_jobs()
+    if recovered:
+        print(f"Recovered {recovered} orphaned or overdue job(s)")
+    _reaper_stop.clear()
+    threading.Thread(target=_reaper_loop, args=(_reaper_stop,), name="job-reaper", daemon=True).start()
+
+    workers = [spawn_process(_process_main, (index, queues, mode, concurrency)) for index in range(processes)]
+    # Runs before multiprocessing's own exit handler, which would otherwise wait on them
+    atexit.register(stop_pool, workers)
+    return workers
+
+
+def spawn_process(target, args: tuple):
+    """Starts one worker-pool process.
+
+    Not daemonic: workers start process pools of their own (parallel extraction of large
+    PDFs, batch preparation), and daemonic processes cannot have children. `stop_pool`
+    terminates and joins them explicitly instead.
+    """
+    proc = multiprocessing.get_context("spawn").Process(target=target, args=args)
+    proc.start()
+    return proc
+
+
+def stop_pool(workers: list, timeout: float = 10.0):
+    _reaper_stop.set()
+    for proc in workers:
+        proc.terminate()
+    for proc in workers:
+        proc.join(timeout)
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run financial analysis queue workers")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("WORKER_PROCESSES", "2")))
+    parser.add_argument("--queues", default=DEFAULT_QUEUES,
+                        help="Comma-separated queue=concurrency_limit pairs")
+    parser.add_argument("--mode", choices=("thread", "async"), default=WORKER_MODE,
+                        help="thread: one job per process at a time; async: many jobs per process on one event loop")
+    parser.add_argument("--concurrency", type=int, default=ASYNC_CONCURRENCY,
+                        help="Jobs per process in async mode")
+    args = parser.parse_args()
+
+    pool = start_pool(args.processes, parse_queues(args.queues), args.mode, args.concurrency)
+    try:
+        for proc in pool:
+            proc.join()
+    except KeyboardInterrupt:
+        stop_pool(pool)